@@ -0,0 +1 @@
+"""Offline benchmarks for the TP-Link IPC Camera integration."""
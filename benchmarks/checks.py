@@ -0,0 +1,197 @@
+"""Regression checks for failure paths that the benchmarks do not exercise.
+
+Each check drives the integration against the simulated camera on the
+loopback interface and fails with an AssertionError. From the repository root:
+
+    python -m benchmarks.checks
+    python -m benchmarks.checks --check cancelled_probe
+
+timed_out_write sets the integration up in the in-process Home Assistant of
+the startup benchmark, so it needs the same environment.
+
+The exit status is 1 if a check failed.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+import aiohttp
+
+from custom_components.tplink_ipc.api import (
+    BREAKER_FAILURE_THRESHOLD,
+    CircuitBreaker,
+    TPLinkIPCApiClient,
+)
+
+from custom_components.tplink_ipc import talkback
+
+from .run import PASSWORD, USERNAME, cameras, media_server
+
+
+async def _wait_for(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("condition not reached in time")
+        await asyncio.sleep(0.01)
+
+
+async def check_cancelled_probe():
+    """A probe cancelled mid-flight reopens the circuit, and the next call probes again."""
+    async with cameras(1, latency=1.0) as (fake,):
+        client = TPLinkIPCApiClient(fake.host, USERNAME, PASSWORD)
+        try:
+            breaker = client.breaker
+            for _ in range(BREAKER_FAILURE_THRESHOLD):
+                breaker.record_failure()
+            breaker._retry_at = 0.0  # pylint: disable=protected-access
+            call = asyncio.ensure_future(client.request(TPLinkIPCApiClient.PAYLOAD_GET_LENSMASK))
+            await _wait_for(lambda: breaker.state == CircuitBreaker.HALF_OPEN)
+            call.cancel()
+            await asyncio.gather(call, return_exceptions=True)
+            assert breaker.state == CircuitBreaker.OPEN, breaker.state
+            fake.latency = 0.0
+            await client.request(TPLinkIPCApiClient.PAYLOAD_GET_LENSMASK)
+            assert breaker.state == CircuitBreaker.CLOSED, breaker.state
+        finally:
+            await client.close()
+
+
+async def check_timed_out_write():
+    """set_lens_mask drops a write that timed out in the queue and flags one already sent."""
+    from custom_components.tplink_ipc.const import DOMAIN  # pylint: disable=import-outside-toplevel
+    from homeassistant.setup import async_setup_component  # pylint: disable=import-outside-toplevel
+
+    from .home_assistant import add_camera_entry, home_assistant  # pylint: disable=import-outside-toplevel
+
+    async with cameras(1) as (fake,), home_assistant() as hass:
+        entry = add_camera_entry(hass, DOMAIN, "Camera", {
+            "host": fake.host, "username": USERNAME, "password": PASSWORD,
+        })
+        assert await async_setup_component(hass, DOMAIN, {})
+        await hass.async_block_till_done()
+        coordinator = hass.data[DOMAIN][entry.entry_id].coordinator
+        entity_id = next(
+            state.entity_id for state in hass.states.async_all("switch")
+            if state.entity_id.endswith("lens_mask")
+        )
+
+        async def set_lens_mask(enabled):
+            return await hass.services.async_call(
+                DOMAIN, "set_lens_mask", {"entity_id": entity_id, "enabled": enabled, "timeout": 1},
+                blocking=True, return_response=True,
+            )
+
+        fake.latency = 2.0
+        first = asyncio.ensure_future(
+            coordinator.async_write("lens_mask", TPLinkIPCApiClient.PAYLOAD_SET_LENSMASK_ON)
+        )
+        await asyncio.sleep(0.1)
+        queued = await set_lens_mask(False)
+        assert queued["failed"] == 1 and queued["unconfirmed"] == 0, queued
+        await first
+        await _wait_for(lambda: coordinator._writer.done(), timeout=5.0)  # pylint: disable=protected-access
+        assert fake.lens_mask == "on", "the timed out write was still applied"
+        sent = await set_lens_mask(False)
+        assert sent["unconfirmed"] == 1 and sent["failed"] == 0, sent
+        await _wait_for(lambda: coordinator._writer.done(), timeout=5.0)  # pylint: disable=protected-access
+        await hass.config_entries.async_unload(entry.entry_id)
+
+
+async def check_stalled_talk_channel(send_timeout=0.5):
+    """A camera that stops reading fails the talk channel instead of hanging playback."""
+    stalled = []
+
+    async def accept(reader, writer):
+        stalled.append(writer)
+
+    server = await asyncio.start_server(accept, "127.0.0.1", 0)
+    default_timeout, talkback.SEND_TIMEOUT = talkback.SEND_TIMEOUT, send_timeout
+    channel = None
+    try:
+        channel = talkback._TalkChannel(  # pylint: disable=protected-access
+            *await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        )
+        frame = bytes(64 * 1024)
+        async with asyncio.timeout(30):
+            try:
+                while True:
+                    await channel.send(frame)
+            except ConnectionError:
+                pass
+            assert isinstance(channel.error, TimeoutError), repr(channel.error)
+            try:
+                await channel.flush()
+            except ConnectionError:
+                pass
+            else:
+                raise AssertionError("flush succeeded on a stalled channel")
+    finally:
+        talkback.SEND_TIMEOUT = default_timeout
+        if channel is not None:
+            await channel.close()
+        for writer in stalled:
+            writer.close()
+        server.close()
+
+
+async def check_failed_prewarm(connect_timeout=0.5):
+    """Playback right after a failed pre-warm reports it instead of handshaking again."""
+    default_timeout, talkback.CONNECT_TIMEOUT = talkback.CONNECT_TIMEOUT, connect_timeout
+    try:
+        async with cameras(1, handshake_latency=5 * connect_timeout) as (fake,), \
+                media_server(0.2) as url, aiohttp.ClientSession() as session:
+            player = talkback.TPLinkTalkbackPlayer(
+                "127.0.0.1", USERNAME, PASSWORD, session, rtsp_port=fake.rtsp_port
+            )
+            try:
+                started = time.monotonic()
+                # As media_player does: pre-warm while the media URL is resolved.
+                prewarm = asyncio.ensure_future(player.prewarm())
+                await asyncio.sleep(0)
+                played = await player.play_media(url)
+                await prewarm
+                elapsed = time.monotonic() - started
+            finally:
+                await player.close()
+        assert not played, "played without a talk channel"
+        assert player.metrics.handshake_failures == 1, player.metrics.handshake_failures
+        assert elapsed < 2 * connect_timeout, f"took {elapsed:.2f} s"
+    finally:
+        talkback.CONNECT_TIMEOUT = default_timeout
+
+
+CHECKS = {
+    "cancelled_probe": check_cancelled_probe,
+    "failed_prewarm": check_failed_prewarm,
+    "stalled_talk_channel": check_stalled_talk_channel,
+    "timed_out_write": check_timed_out_write,
+}
+
+
+async def main(args) -> int:
+    failed = 0
+    for name in args.check:
+        try:
+            await CHECKS[name]()
+        except AssertionError as err:
+            failed += 1
+            print(f"{name}: FAIL {err}", flush=True)
+        else:
+            print(f"{name}: ok", flush=True)
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", nargs="+", choices=sorted(CHECKS), default=list(CHECKS))
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    # The checks provoke failures on purpose; only their verdicts are of interest.
+    logging.basicConfig(level=logging.CRITICAL)
+    sys.exit(asyncio.run(main(parse_args())))
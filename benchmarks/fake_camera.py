@@ -0,0 +1,214 @@
+"""A local stand-in for a TP-Link camera, for benchmarks and tests.
+
+It serves the HTTP API used by TPLinkIPCApiClient (the /pc/Content.htm nonce,
+the login and the stok=.../ds endpoint) and the port-554 MULTITRANS digest
+handshake used by TPLinkTalkbackPlayer, counting the interleaved RTP packets
+sent to it. Both listen on ephemeral loopback ports, so any number of cameras
+can run in one process without network access.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import secrets
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from aiohttp import web
+
+_CSEQ = re.compile(r"^CSeq:\s*(\d+)", re.M | re.I)
+_CONTENT_LENGTH = re.compile(r"^Content-Length:\s*(\d+)", re.M | re.I)
+_AUTH_RESPONSE = re.compile(r'response="([0-9a-f]+)"')
+_AUTH_NONCE = re.compile(r'nonce="([^"]*)"')
+
+
+def _md5(value: str) -> str:
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+@dataclass
+class FakeCameraStats:
+    """What a fake camera has been asked to do."""
+
+    nonce_requests: int = 0
+    logins: int = 0
+    requests: int = 0
+    expired_stoks: int = 0
+    handshakes: int = 0
+    challenges: int = 0
+    rtp_packets: int = 0
+    rtp_bytes: int = 0
+    # loop.time() of the first RTP packet on each talk channel.
+    first_packets: List[float] = field(default_factory=list)
+
+
+class FakeCamera:
+    """One simulated camera.
+
+    stok_ttl expires logins after that many seconds (None keeps them valid),
+    latency delays every HTTP reply and handshake_latency every RTSP reply.
+    rotate_nonce makes the RTSP digest nonce single-use, so a reused
+    challenge is answered with a fresh 401 like the real firmware does.
+    """
+
+    def __init__(self, username="admin", password="password", *, stok_ttl: Optional[float] = None,
+                 latency: float = 0.0, handshake_latency: float = 0.0, rotate_nonce=False):
+        self.username = username
+        self.password = password
+        self.stok_ttl = stok_ttl
+        self.latency = latency
+        self.handshake_latency = handshake_latency
+        self.rotate_nonce = rotate_nonce
+        self.lens_mask = "off"
+        self.stats = FakeCameraStats()
+        self._nonce = secrets.token_hex(8)
+        self._stoks = {}
+        self._digest_nonce = secrets.token_hex(8)
+        self._runner: Optional[web.AppRunner] = None
+        self._rtsp: Optional[asyncio.AbstractServer] = None
+        self.http_port = 0
+        self.rtsp_port = 0
+
+    @property
+    def host(self) -> str:
+        """The host argument for TPLinkIPCApiClient."""
+        return f"127.0.0.1:{self.http_port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/pc/Content.htm", self._handle_nonce)
+        app.router.add_post("/", self._handle_login)
+        app.router.add_post("/stok={stok}/ds", self._handle_ds)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+        self.http_port = self._runner.addresses[0][1]
+        self._rtsp = await asyncio.start_server(self._handle_rtsp, "127.0.0.1", 0)
+        self.rtsp_port = self._rtsp.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._rtsp is not None:
+            self._rtsp.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def expire_stoks(self):
+        """Invalidate every issued stok, as the firmware does at random."""
+        self._stoks.clear()
+
+    async def _delay(self, seconds):
+        if seconds:
+            await asyncio.sleep(seconds)
+
+    async def _handle_nonce(self, request):
+        self.stats.nonce_requests += 1
+        await self._delay(self.latency)
+        return web.json_response({"error_code": -40401, "data": {"nonce": self._nonce}})
+
+    async def _handle_login(self, request):
+        await self._delay(self.latency)
+        body = json.loads(await request.read())
+        login = body.get("login", {})
+        expected = _md5(f"{self.password}:{self._nonce}")
+        if login.get("username") != self.username or login.get("password") != expected:
+            return web.json_response({"error_code": -40210})
+        self.stats.logins += 1
+        stok = secrets.token_hex(16)
+        self._stoks[stok] = time.monotonic()
+        return web.json_response({"error_code": 0, "stok": stok})
+
+    async def _handle_ds(self, request):
+        await self._delay(self.latency)
+        self.stats.requests += 1
+        issued = self._stoks.get(request.match_info["stok"])
+        if issued is None or (self.stok_ttl is not None and time.monotonic() - issued > self.stok_ttl):
+            self.stats.expired_stoks += 1
+            return web.json_response({"error_code": -40401})
+        body = json.loads(await request.read())
+        if body.get("method") == "set":
+            info = body.get("lens_mask", {}).get("lens_mask_info", {})
+            self.lens_mask = info.get("enabled", self.lens_mask)
+            return web.json_response({"error_code": 0})
+        result = {"error_code": 0}
+        if "lens_mask" in body:
+            result["lens_mask"] = {"lens_mask_info": {"enabled": self.lens_mask}}
+        if "device_info" in body:
+            result["device_info"] = {"basic_info": {
+                "device_model": "FAKE-IPC", "sw_version": "1.0.0", "hw_version": "1.0",
+            }}
+        return web.json_response(result)
+
+    def _challenge(self, cseq):
+        self.stats.challenges += 1
+        return (f'RTSP/1.0 401 Unauthorized\r\nCSeq: {cseq}\r\n'
+                f'WWW-Authenticate: Digest realm="TP-LINK IP-Camera", nonce="{self._digest_nonce}"\r\n\r\n')
+
+    def _check_digest(self, head):
+        response = _AUTH_RESPONSE.search(head)
+        nonce = _AUTH_NONCE.search(head)
+        if not response or not nonce or nonce.group(1) != self._digest_nonce:
+            return False
+        ha1 = _md5(f"{self.username}:TP-LINK IP-Camera:{self.password}")
+        uri = head.split(" ", 2)[1]
+        ha2 = _md5(f"MULTITRANS:{uri}")
+        return response.group(1) == _md5(f"{ha1}:{nonce.group(1)}:{ha2}")
+
+    async def _handle_rtsp(self, reader, writer):
+        buffer = bytearray()
+        session = None
+        first_packet = True
+        loop = asyncio.get_running_loop()
+        try:
+            while data := await reader.read(65536):
+                buffer += data
+                while buffer:
+                    if buffer[:1] == b"$":
+                        if len(buffer) < 4:
+                            break
+                        length = struct.unpack_from("!H", buffer, 2)[0]
+                        if len(buffer) < 4 + length:
+                            break
+                        if first_packet:
+                            first_packet = False
+                            self.stats.first_packets.append(loop.time())
+                        self.stats.rtp_packets += 1
+                        self.stats.rtp_bytes += length - 12
+                        del buffer[:4 + length]
+                        continue
+                    end = buffer.find(b"\r\n\r\n")
+                    if end < 0:
+                        break
+                    head = bytes(buffer[:end]).decode(errors="replace")
+                    match = _CONTENT_LENGTH.search(head)
+                    length = int(match.group(1)) if match else 0
+                    if len(buffer) < end + 4 + length:
+                        break
+                    del buffer[:end + 4 + length]
+                    await self._delay(self.handshake_latency)
+                    reply, session = self._rtsp_reply(head, session)
+                    writer.write(reply.encode())
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _rtsp_reply(self, head, session):
+        """Answer one MULTITRANS request; returns the reply and the session id."""
+        match = _CSEQ.search(head)
+        cseq = match.group(1) if match else "0"
+        if "Authorization:" in head:
+            if not self._check_digest(head):
+                return self._challenge(cseq), session
+            if self.rotate_nonce:
+                self._digest_nonce = secrets.token_hex(8)
+            session = secrets.token_hex(4)
+            return f"RTSP/1.0 200 OK\r\nCSeq: {cseq}\r\nSession: {session};timeout=60\r\n\r\n", session
+        if session is not None and f"Session: {session}" in head:
+            self.stats.handshakes += 1
+            body = json.dumps({"type": "response", "seq": 0, "params": {"error_code": 0}})
+            return (f"RTSP/1.0 200 OK\r\nCSeq: {cseq}\r\nSession: {session}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n{body}"), session
+        return self._challenge(cseq), session
@@ -0,0 +1,74 @@
+"""A minimal in-process Home Assistant instance for the startup benchmark.
+
+It loads the registries, auth and the http component (which media_player
+needs) the way bootstrap does, without the rest of the default config. HTTP
+listens on a free loopback port and all state lives in a temporary config
+directory that links this repository's custom_components.
+"""
+import os
+import shutil
+import socket
+import tempfile
+from contextlib import asynccontextmanager
+
+from homeassistant import auth, loader
+from homeassistant.config_entries import ConfigEntries, ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import (
+    area_registry,
+    category_registry,
+    device_registry,
+    entity_registry,
+    floor_registry,
+    frame,
+    label_registry,
+    restore_state,
+    translation,
+)
+from homeassistant.setup import async_setup_component
+
+CUSTOM_COMPONENTS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "custom_components")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def home_assistant():
+    """Run a Home Assistant core with only what the integration depends on."""
+    config_dir = tempfile.mkdtemp(prefix="tplink_ipc_bench_")
+    os.symlink(os.path.abspath(CUSTOM_COMPONENTS), os.path.join(config_dir, "custom_components"))
+    hass = HomeAssistant(config_dir)
+    try:
+        hass.config.skip_pip = True
+        frame.async_setup(hass)
+        loader.async_setup(hass)
+        for registry in (area_registry, category_registry, device_registry, entity_registry,
+                         floor_registry, label_registry):
+            await registry.async_load(hass)
+        await restore_state.async_load(hass)
+        translation.async_setup(hass)
+        hass.auth = await auth.auth_manager_from_config(hass, [], [])
+        hass.config_entries = ConfigEntries(hass, {})
+        await hass.config_entries.async_initialize()
+        http = {"server_host": ["127.0.0.1"], "server_port": _free_port()}
+        for domain, config in (("http", {"http": http}), ("network", {})):
+            if not await async_setup_component(hass, domain, config):
+                raise RuntimeError(f"Could not set up {domain}")
+        yield hass
+    finally:
+        await hass.async_stop(force=True)
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+
+def add_camera_entry(hass: HomeAssistant, domain, title, data) -> ConfigEntry:
+    """Register a config entry without setting it up, as if loaded from storage."""
+    entry = ConfigEntry(
+        domain=domain, title=title, data=data, options={}, source="user", unique_id=None,
+        version=1, minor_version=1, discovery_keys={}, subentries_data=None,
+    )
+    hass.config_entries._entries[entry.entry_id] = entry  # pylint: disable=protected-access
+    return entry
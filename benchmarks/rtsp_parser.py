@@ -0,0 +1,163 @@
+"""Fuzz and benchmark the incremental RTSP parser used by the talkback handshake.
+
+Runs entirely in memory. From the repository root:
+
+    python -m benchmarks.rtsp_parser
+    python -m benchmarks.rtsp_parser --iterations 20000 --seed 7
+
+The split fuzzer feeds a stream of valid responses in random pieces, down to
+single bytes, and checks that every split yields exactly the responses of a
+one-shot parse. The mutation fuzzer flips, drops and inserts bytes and checks
+that the parser only ever fails with RtspProtocolError and keeps its buffer
+bounded. The benchmark reports responses parsed per second for whole,
+pipelined and byte-at-a-time reads. The exit status is 1 if a fuzzer failed.
+"""
+import argparse
+import json
+import random
+import struct
+import sys
+import time
+from typing import Dict, List
+
+from custom_components.tplink_ipc.rtsp import (
+    MAX_BODY_BYTES,
+    MAX_HEADER_BYTES,
+    RtspProtocolError,
+    RtspResponseParser,
+)
+
+_BODY = json.dumps({"type": "response", "seq": 0, "params": {"error_code": 0}}).encode()
+
+# The replies of one MULTITRANS handshake, with the quirks seen on cameras:
+# repeated challenges, a Session timeout, stray line breaks and an interleaved
+# RTP frame arriving before the final reply.
+RESPONSES = [
+    b'RTSP/1.0 401 Unauthorized\r\nCSeq: 0\r\n'
+    b'WWW-Authenticate: Digest realm="TP-LINK IP-Camera", nonce="2f1b5c9e"\r\n'
+    b'WWW-Authenticate: Basic realm="TP-LINK IP-Camera"\r\n\r\n',
+    b'RTSP/1.0 200 OK\r\nCSeq: 1\r\nSession: 5a6b7c8d;timeout=60\r\n\r\n',
+    b'\r\n',
+    b'$\x01' + struct.pack('!H', 172) + bytes(172),
+    b'RTSP/1.0 200 OK\r\nCSeq: 2\r\nSession: 5a6b7c8d\r\nContent-Type: application/json\r\n'
+    b'Content-Length: ' + str(len(_BODY)).encode() + b'\r\n\r\n' + _BODY,
+]
+STREAM = b''.join(RESPONSES)
+
+
+def _summary(responses) -> List:
+    return [(r.status, r.reason, r.headers, r.body) for r in responses]
+
+
+def _feed_pieces(data: bytes, cuts: List[int]):
+    parser = RtspResponseParser()
+    responses = []
+    for start, end in zip([0] + cuts, cuts + [len(data)]):
+        responses.extend(parser.feed(data[start:end]))
+    return responses
+
+
+def fuzz_splits(rng: random.Random, iterations: int) -> Dict:
+    """Random splits of a valid stream must parse like the whole stream."""
+    expected = _summary(RtspResponseParser().feed(STREAM))
+    failures = []
+    for _ in range(iterations):
+        if rng.random() < 0.1:
+            cuts = list(range(1, len(STREAM)))
+        else:
+            cuts = sorted(rng.sample(range(1, len(STREAM)), rng.randint(1, 12)))
+        if _summary(_feed_pieces(STREAM, cuts)) != expected:
+            failures.append(cuts)
+    return {"fuzzer": "splits", "iterations": iterations, "failures": len(failures),
+            "first_failure": failures[0] if failures else None}
+
+
+def _mutate(rng: random.Random, data: bytes) -> bytes:
+    data = bytearray(data)
+    for _ in range(rng.randint(1, 8)):
+        action = rng.random()
+        position = rng.randrange(len(data) + 1)
+        if action < 0.4 and position < len(data):
+            data[position] = rng.randrange(256)
+        elif action < 0.6 and position < len(data):
+            del data[position:position + rng.randint(1, 16)]
+        elif action < 0.8:
+            data[position:position] = rng.choice(
+                [b'\r\n', b'\r\n\r\n', b':', b'$', b'Content-Length: -1\r\n',
+                 b'Content-Length: 99999999\r\n', b'Content-Length: x\r\n', bytes([rng.randrange(256)])]
+            )
+        else:
+            data = data[:position]
+    return bytes(data)
+
+
+def fuzz_mutations(rng: random.Random, iterations: int) -> Dict:
+    """Corrupted input may only raise RtspProtocolError and must stay bounded."""
+    failures = []
+    bound = MAX_HEADER_BYTES + MAX_BODY_BYTES + len(STREAM)
+    for _ in range(iterations):
+        data = _mutate(rng, STREAM * rng.randint(1, 3))
+        parser = RtspResponseParser()
+        try:
+            position = 0
+            while position < len(data):
+                size = rng.randint(1, 64)
+                parser.feed(data[position:position + size])
+                position += size
+                if len(parser._buffer) > bound:
+                    raise AssertionError(f"buffer grew to {len(parser._buffer)} bytes")
+        except RtspProtocolError:
+            pass
+        except Exception as err:  # pylint: disable=broad-except
+            failures.append((data, repr(err)))
+    return {"fuzzer": "mutations", "iterations": iterations, "failures": len(failures),
+            "first_failure": repr(failures[0]) if failures else None}
+
+
+def bench(name, pieces: List[bytes], responses_per_run: int, seconds: float) -> Dict:
+    runs = 0
+    started = time.perf_counter()
+    while (elapsed := time.perf_counter() - started) < seconds:
+        parser = RtspResponseParser()
+        for piece in pieces:
+            parser.feed(piece)
+        runs += 1
+    size = sum(len(piece) for piece in pieces)
+    return {
+        "benchmark": name,
+        "responses_per_s": round(runs * responses_per_run / elapsed),
+        "mb_per_s": round(runs * size / elapsed / 1e6, 2),
+        "us_per_response": round(elapsed / (runs * responses_per_run) * 1e6, 2),
+    }
+
+
+def main(args) -> int:
+    rng = random.Random(args.seed)
+    rows = [fuzz_splits(rng, args.iterations), fuzz_mutations(rng, args.iterations)]
+    count = len(RtspResponseParser().feed(STREAM))
+    pipelined = STREAM * 100
+    rows += [
+        bench("handshake_whole", [STREAM], count, args.seconds),
+        bench("handshake_bytewise", [STREAM[i:i + 1] for i in range(len(STREAM))], count, args.seconds),
+        bench("pipelined_x100", [pipelined[i:i + 4096] for i in range(0, len(pipelined), 4096)],
+              count * 100, args.seconds),
+    ]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for row in rows:
+            print("  ".join(f"{key}={value}" for key, value in row.items()), flush=True)
+    return 1 if any(row.get("failures") for row in rows) else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000, help="inputs per fuzzer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seconds", type=float, default=1.0, help="duration of each benchmark")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
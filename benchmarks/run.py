@@ -0,0 +1,368 @@
+"""Benchmark the API client and talkback player against simulated cameras.
+
+Everything runs on the loopback interface, so no camera or network access is
+needed. Run from the repository root in an environment with Home Assistant
+installed, which brings aiohttp (the integration package imports it):
+
+    python -m benchmarks.run
+    python -m benchmarks.run --cameras 1 10 --scenario api --latency 0.02
+
+Each scenario prints one row per camera count with throughput, p50/p99
+latency, the peak number of threads and, for audio, the time from the play
+request to the first packet. The session scenario compares that time on a new
+talk channel (cold) with a reused one (warm), and api_legacy runs the api
+scenario against the old requests-based client (benchmarks/legacy_api.py,
+needs the requests package) for a before/after comparison:
+
+    python -m benchmarks.run --scenario api api_legacy --latency 0.02
+
+The startup scenario sets the integration up in an in-process Home Assistant
+with one config entry per camera. It reports how long setup took, how long
+until every reachable camera had been polled, and, with --slow, that a
+few slow cameras do not hold up the others.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import math
+import struct
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+import aiohttp
+from aiohttp import web
+
+from custom_components.tplink_ipc.api import TPIPCApiError, TPLinkIPCApiClient
+from custom_components.tplink_ipc.talkback import TPLinkTalkbackPlayer
+
+from .fake_camera import FakeCamera
+
+USERNAME = "admin"
+PASSWORD = "password"
+# Home Assistant's shared executor, which the old client's calls ran in.
+HA_EXECUTOR_WORKERS = 64
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile; 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class ThreadSampler:
+    """Records the peak number of live threads while a scenario runs."""
+
+    def __init__(self, interval=0.005):
+        self.peak = threading.active_count()
+        self._interval = interval
+        self._task = None
+
+    async def _sample(self):
+        while True:
+            self.peak = max(self.peak, threading.active_count())
+            await asyncio.sleep(self._interval)
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._sample())
+        return self
+
+    def __exit__(self, *exc):
+        self.peak = max(self.peak, threading.active_count())
+        self._task.cancel()
+
+
+@asynccontextmanager
+async def cameras(count, **options):
+    """Run count fake cameras."""
+    started = [FakeCamera(USERNAME, PASSWORD, **options) for _ in range(count)]
+    await asyncio.gather(*(camera.start() for camera in started))
+    try:
+        yield started
+    finally:
+        await asyncio.gather(*(camera.stop() for camera in started))
+
+
+@asynccontextmanager
+async def media_server(clip_seconds: float):
+    """Serve a generated 16 kHz mono WAV clip; yields its URL."""
+    frames = int(16000 * clip_seconds)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as clip:
+        clip.setnchannels(1)
+        clip.setsampwidth(2)
+        clip.setframerate(16000)
+        clip.writeframes(struct.pack(
+            f"<{frames}h", *(int(8000 * math.sin(i / 10)) for i in range(frames))
+        ))
+    body = buffer.getvalue()
+    app = web.Application()
+    app.router.add_get("/clip.wav", lambda request: web.Response(body=body))
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    try:
+        yield f"http://127.0.0.1:{runner.addresses[0][1]}/clip.wav"
+    finally:
+        await runner.cleanup()
+
+
+def latency_row(name, count, latencies, elapsed, threads, **extra) -> Dict:
+    row = {
+        "scenario": name,
+        "cameras": count,
+        "operations": len(latencies),
+        "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "threads": threads,
+    }
+    row.update(extra)
+    return row
+
+
+async def bench_api(count, args) -> Dict:
+    """Concurrent lens-mask reads through TPLinkIPCApiClient, with stok expiry."""
+    async with cameras(count, stok_ttl=args.stok_ttl, latency=args.latency) as fakes:
+        clients = [TPLinkIPCApiClient(fake.host, USERNAME, PASSWORD) for fake in fakes]
+        latencies: List[float] = []
+        failures = 0
+
+        async def timed_read(client):
+            nonlocal failures
+            started = time.monotonic()
+            try:
+                await client.get_lens_mask_status()
+            except TPIPCApiError:
+                failures += 1
+            else:
+                latencies.append(time.monotonic() - started)
+
+        async def drive(client):
+            for _ in range(args.requests // args.concurrency):
+                await asyncio.gather(*(timed_read(client) for _ in range(args.concurrency)))
+
+        try:
+            with ThreadSampler() as threads:
+                started = time.monotonic()
+                await asyncio.gather(*(drive(client) for client in clients))
+                elapsed = time.monotonic() - started
+        finally:
+            await asyncio.gather(*(client.close() for client in clients))
+        return latency_row(
+            "api", count, latencies, elapsed, threads.peak,
+            failures=failures,
+            logins=sum(fake.stats.logins for fake in fakes),
+            stok_retries=sum(client.stats.stok_retries for client in clients),
+        )
+
+
+async def bench_api_legacy(count, args) -> Dict:
+    """The api scenario with the old requests client, called through an executor."""
+    from . import legacy_api  # pylint: disable=import-outside-toplevel
+
+    async with cameras(count, stok_ttl=args.stok_ttl, latency=args.latency) as fakes:
+        clients = [legacy_api.TPLinkIPCApiClient(fake.host, USERNAME, PASSWORD) for fake in fakes]
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(HA_EXECUTOR_WORKERS, thread_name_prefix="SyncWorker")
+        latencies: List[float] = []
+        failures = 0
+
+        async def timed_read(client):
+            nonlocal failures
+            started = time.monotonic()
+            try:
+                await loop.run_in_executor(executor, client.get_lens_mask_status)
+            except legacy_api.TPIPCApiError:
+                failures += 1
+            else:
+                latencies.append(time.monotonic() - started)
+
+        async def drive(client):
+            for _ in range(args.requests // args.concurrency):
+                await asyncio.gather(*(timed_read(client) for _ in range(args.concurrency)))
+
+        try:
+            with ThreadSampler() as threads:
+                started = time.monotonic()
+                await asyncio.gather(*(drive(client) for client in clients))
+                elapsed = time.monotonic() - started
+        finally:
+            executor.shutdown(wait=False)
+            for client in clients:
+                client.session.close()
+        return latency_row(
+            "api_legacy", count, latencies, elapsed, threads.peak,
+            failures=failures,
+            logins=sum(fake.stats.logins for fake in fakes),
+        )
+
+
+async def bench_startup(count, args) -> Dict:
+    """Integration setup with count config entries, --slow of them slow to answer."""
+    from custom_components.tplink_ipc.const import DOMAIN  # pylint: disable=import-outside-toplevel
+    from homeassistant.setup import async_setup_component  # pylint: disable=import-outside-toplevel
+
+    from .home_assistant import add_camera_entry, home_assistant  # pylint: disable=import-outside-toplevel
+
+    slow = min(args.slow, count)
+    async with cameras(count - slow, latency=args.latency) as fakes, \
+            cameras(slow, latency=args.slow_latency) as slow_fakes, home_assistant() as hass:
+        entries = [
+            add_camera_entry(hass, DOMAIN, f"Camera {index}", {
+                "host": fake.host, "username": USERNAME, "password": PASSWORD,
+            })
+            for index, fake in enumerate(fakes + slow_fakes)
+        ]
+        with ThreadSampler() as threads:
+            started = time.monotonic()
+            if not await async_setup_component(hass, DOMAIN, {}):
+                raise RuntimeError("Integration setup failed")
+            setup = time.monotonic() - started
+            entities = len(hass.states.async_entity_ids())
+            coordinators = [hass.data[DOMAIN][entry.entry_id].coordinator for entry in entries]
+
+            async def first_data(coordinator):
+                while not coordinator.data:
+                    await asyncio.sleep(0.005)
+                return time.monotonic() - started
+
+            polled = await asyncio.gather(*(first_data(c) for c in coordinators[:len(fakes)]))
+            all_polled = await asyncio.gather(*(first_data(c) for c in coordinators[len(fakes):]))
+        row = latency_row("startup", count, polled, setup, threads.peak)
+        del row["throughput_per_s"]
+        row.update(
+            setup_ms=round(setup * 1000, 2),
+            entities_at_setup=entities,
+            slow=slow,
+            slow_polled_ms=round(max(all_polled, default=0.0) * 1000, 2),
+            logins=sum(fake.stats.logins for fake in fakes + slow_fakes),
+        )
+        return row
+
+
+async def bench_talkback(count, args) -> Dict:
+    """One announcement played on every camera at once."""
+    async with cameras(count, handshake_latency=args.latency) as fakes, \
+            media_server(args.clip_seconds) as url, aiohttp.ClientSession() as session:
+        players = [
+            TPLinkTalkbackPlayer("127.0.0.1", USERNAME, PASSWORD, session,
+                                 rtsp_port=fake.rtsp_port)
+            for fake in fakes
+        ]
+        try:
+            with ThreadSampler() as threads:
+                started = time.monotonic()
+                await asyncio.gather(*(player.play_media(url) for player in players))
+                elapsed = time.monotonic() - started
+        finally:
+            await asyncio.gather(*(player.close() for player in players))
+        first_packets = [
+            player.last_timings.first_packet for player in players
+            if player.last_timings and player.last_timings.first_packet is not None
+        ]
+        packets = sum(fake.stats.rtp_packets for fake in fakes)
+        row = latency_row(
+            "talkback", count, first_packets, elapsed, threads.peak,
+            packets_per_s=round(packets / elapsed, 1),
+            late_packets=sum(player.last_pacing.late_packets for player in players),
+            # A camera that never received audio failed, whatever play_media reported.
+            failures=sum(not fake.stats.first_packets for fake in fakes),
+            handshakes=sum(fake.stats.handshakes for fake in fakes),
+        )
+        row["throughput_per_s"] = round(count / elapsed, 2)
+        return row
+
+
+async def bench_session(count, args) -> Dict:
+    """Time to first packet on a new talk channel, then on the reused one.
+
+    Use --latency to model the round-trip time of each handshake step.
+    """
+    async with cameras(count, handshake_latency=args.latency) as fakes, \
+            media_server(args.clip_seconds) as url, aiohttp.ClientSession() as session:
+        players = [
+            TPLinkTalkbackPlayer("127.0.0.1", USERNAME, PASSWORD, session,
+                                 rtsp_port=fake.rtsp_port)
+            for fake in fakes
+        ]
+        cold: List[float] = []
+        warm: List[float] = []
+
+        async def play_twice(player):
+            for first_packets in (cold, warm):
+                await player.play_media(url)
+                if player.last_timings and player.last_timings.first_packet is not None:
+                    first_packets.append(player.last_timings.first_packet)
+            return player.last_timings is not None and player.last_timings.reused_channel
+
+        try:
+            with ThreadSampler() as threads:
+                started = time.monotonic()
+                reused = await asyncio.gather(*(play_twice(player) for player in players))
+                elapsed = time.monotonic() - started
+        finally:
+            await asyncio.gather(*(player.close() for player in players))
+        row = latency_row("session", count, cold + warm, elapsed, threads.peak)
+        del row["p50_ms"], row["p99_ms"]
+        row.update(
+            cold_p50_ms=round(percentile(cold, 0.5) * 1000, 2),
+            cold_p99_ms=round(percentile(cold, 0.99) * 1000, 2),
+            warm_p50_ms=round(percentile(warm, 0.5) * 1000, 2),
+            warm_p99_ms=round(percentile(warm, 0.99) * 1000, 2),
+            reused=reused.count(True),
+            handshakes=sum(fake.stats.handshakes for fake in fakes),
+        )
+        return row
+
+
+SCENARIOS = {
+    "api": bench_api,
+    "api_legacy": bench_api_legacy,
+    "talkback": bench_talkback,
+    "session": bench_session,
+    "startup": bench_startup,
+}
+
+
+async def main(args):
+    rows = []
+    for name in args.scenario:
+        for count in args.cameras:
+            rows.append(await SCENARIOS[name](count, args))
+            if not args.json:
+                print("  ".join(f"{key}={value}" for key, value in rows[-1].items()), flush=True)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS),
+                        default=[name for name in SCENARIOS if name != "api_legacy"])
+    parser.add_argument("--cameras", nargs="+", type=int, default=[1, 10, 100])
+    parser.add_argument("--requests", type=int, default=40, help="API reads per camera")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent reads per camera")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to every fake camera reply")
+    parser.add_argument("--stok-ttl", type=float, default=None,
+                        help="seconds before a fake camera expires a login")
+    parser.add_argument("--clip-seconds", type=float, default=1.0)
+    parser.add_argument("--slow", type=int, default=0,
+                        help="cameras answering after --slow-latency in the startup scenario")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    # Expired stoks and dropped talk sessions are expected here; keep the table readable.
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(main(parse_args()))
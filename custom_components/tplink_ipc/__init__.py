@@ -4,11 +4,34 @@ from __future__ import annotations
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_USERNAME
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.helpers.typing import ConfigType
 
-from .api import TPLinkIPCApiClient
-from .const import DOMAIN, PLATFORMS
+from .cache import AnnouncementCache
+from .const import (
+    AUDIO_CACHE_DIR,
+    AUDIO_CACHE_MEMORY_BYTES,
+    CONF_AUDIO_CACHE_MB,
+    CONF_LEAD_IN_MS,
+    DATA_AUDIO_CACHE,
+    DEFAULT_AUDIO_CACHE_MB,
+    DEFAULT_LEAD_IN_MS,
+    DOMAIN,
+    PLATFORMS,
+)
+from .coordinator import TPLinkIPCDataUpdateCoordinator
 from .models import TPLinkCameraData
-from .talkback import TPLinkTalkbackPlayer
+from .registry import async_get_registry
+from .services import async_setup_services
+
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the TP-Link IPC integration."""
+    async_setup_services(hass)
+    return True
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
@@ -19,31 +42,67 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     username = entry.data[CONF_USERNAME]
     password = entry.data[CONF_PASSWORD]
 
-    # Create both API and Talkback clients
-    api_client = TPLinkIPCApiClient(
-        host=host,
-        username=username,
-        password=password,
-    )
-    
-    talkback_client = TPLinkTalkbackPlayer(
-        ip=host,
-        user=username,
-        password=password,
+    # One announcement cache is shared by every camera, so the largest size
+    # set on any of them applies; 0 everywhere turns the cache off.
+    cache_bytes = max(
+        configured.options.get(CONF_AUDIO_CACHE_MB, DEFAULT_AUDIO_CACHE_MB)
+        for configured in hass.config_entries.async_entries(DOMAIN)
+    ) * 1024 * 1024
+    if (cache := hass.data.get(DATA_AUDIO_CACHE)) is None:
+        cache = await hass.async_add_executor_job(
+            AnnouncementCache,
+            hass.config.path(STORAGE_DIR, AUDIO_CACHE_DIR),
+            cache_bytes,
+            AUDIO_CACHE_MEMORY_BYTES,
+        )
+        cache = hass.data.setdefault(DATA_AUDIO_CACHE, cache)
+    await hass.async_add_executor_job(cache.resize, cache_bytes)
+
+    # Clients are shared per camera login, so a reload or the config flow that
+    # just validated the credentials hands over its connection and stok.
+    clients = async_get_registry(hass).async_acquire(
+        host,
+        username,
+        password,
+        lead_in_ms=entry.options.get(CONF_LEAD_IN_MS, DEFAULT_LEAD_IN_MS),
+        cache=cache,
     )
+    api_client = clients.api_client
+    talkback_client = clients.talkback_client
+
+    coordinator = TPLinkIPCDataUpdateCoordinator(hass, api_client, entry)
 
     # Store clients in a data container
     camera_data = TPLinkCameraData(
-        api_client=api_client, talkback_client=talkback_client
+        api_client=api_client,
+        talkback_client=talkback_client,
+        coordinator=coordinator,
+        metrics=clients.metrics,
     )
     hass.data[DOMAIN][entry.entry_id] = camera_data
+    entry.async_on_unload(lambda: async_get_registry(hass).async_release(clients))
 
-    # Forward setup to platforms (switch and media_player)
+    # Forward setup to platforms (switch, media_player and sensor)
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    # Entities register their reads while the platforms set up, so the first
+    # batched poll can only run once they are all in place. It runs in the
+    # background: entities start from their restored state, and a slow or
+    # offline camera no longer holds up Home Assistant startup.
+    entry.async_create_background_task(
+        hass, coordinator.async_refresh(), f"{DOMAIN} first refresh {entry.title}"
+    )
+
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+
     return True
 
 
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
@@ -1,55 +1,207 @@
-import requests
+import asyncio
 import hashlib
 import logging
-from typing import Dict, Any
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional
+
+import aiohttp
+
+from .metrics import DeviceMetrics
 
 _LOGGER = logging.getLogger(__name__)
 
+NONCE_TIMEOUT = 5
+LOGIN_TIMEOUT = 5
+REQUEST_TIMEOUT = 10
+# The firmware silently expires a stok after a period of use; logging in again a
+# bit before that keeps the two-round-trip re-login off user-facing calls.
+STOK_REFRESH_AFTER = 15 * 60
+# Consecutive network failures before a camera is treated as unreachable.
+BREAKER_FAILURE_THRESHOLD = 2
+BREAKER_BASE_BACKOFF = 15
+BREAKER_MAX_BACKOFF = 10 * 60
+PROBE_TIMEOUT = 3
+
 class TPIPCApiError(Exception):
     """Custom TPIPC API exception."""
     def __init__(self, message, error_code=None):
         super().__init__(message)
         self.error_code = error_code
 
+class TPIPCConnectionError(TPIPCApiError):
+    """The device could not be reached or did not answer in time."""
+
+class TPIPCUnavailableError(TPIPCApiError):
+    """The request was skipped because the device is marked unreachable."""
+
+class CircuitBreaker:
+    """Per-host circuit breaker with exponential backoff and jitter.
+
+    After BREAKER_FAILURE_THRESHOLD consecutive failures the circuit opens and
+    calls fail immediately. Once the backoff has elapsed a single caller is
+    let through to probe the device; success closes the circuit, failure
+    reopens it with twice the backoff.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened = 0
+        self._retry_at = 0.0
+        self.transitions: deque = deque(maxlen=20)
+
+    @property
+    def retry_in(self) -> float:
+        return max(0.0, self._retry_at - time.monotonic())
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        _LOGGER.info("Circuit for %s: %s -> %s", self.name, self.state, state)
+        self.transitions.append((time.time(), self.state, state))
+        self.state = state
+
+    def try_begin_probe(self) -> bool:
+        """Return True if the caller should probe an open circuit now."""
+        if self.state == self.OPEN and time.monotonic() >= self._retry_at:
+            self._transition(self.HALF_OPEN)
+            return True
+        return False
+
+    def abort_probe(self):
+        """Reopen the circuit after a probe that ended without an answer, e.g. cancelled.
+
+        The retry time is left as it was, so the next caller probes right away.
+        """
+        if self.state == self.HALF_OPEN:
+            self._transition(self.OPEN)
+
+    def record_success(self):
+        self.failures = 0
+        self._opened = 0
+        self._transition(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= BREAKER_FAILURE_THRESHOLD:
+            self._opened += 1
+            backoff = min(BREAKER_MAX_BACKOFF, BREAKER_BASE_BACKOFF * 2 ** (self._opened - 1))
+            self._retry_at = time.monotonic() + backoff * random.uniform(0.5, 1.0)
+            self._transition(self.OPEN)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the breaker state for diagnostics."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_in": round(self.retry_in, 1),
+            "transitions": [
+                {"at": at, "from": old, "to": new} for at, old, new in self.transitions
+            ],
+        }
+
+@dataclass
+class TPIPCClientStats:
+    """Counters describing the login behaviour of a client."""
+
+    logins: int = 0
+    login_failures: int = 0
+    background_refreshes: int = 0
+    stok_retries: int = 0
+    login_waits: int = 0
+    login_wait_total: float = 0.0
+    login_wait_max: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the counters as a plain dict."""
+        return asdict(self)
+
 class TPLinkIPCApiClient:
-    """A client to interact with TPIPC devices over non-secure HTTP."""
-    
+    """An asyncio client to interact with TPIPC devices over non-secure HTTP."""
+
     PAYLOAD_GET_LENSMASK = {"method": "get", "lens_mask": {"name": ["lens_mask_info"]}}
     PAYLOAD_SET_LENSMASK_ON = {"method": "set", "lens_mask": {"lens_mask_info": {"enabled": "on"}}}
     PAYLOAD_SET_LENSMASK_OFF = {"method": "set", "lens_mask": {"lens_mask_info": {"enabled": "off"}}}
 
-    def __init__(self, host: str, username: str, password: str):
+    HEADERS = {"Content-Type": "application/json; charset=utf-8", "User-Agent": "TP-LINK_APP"}
+
+    def __init__(self, host: str, username: str, password: str,
+                 metrics: Optional[DeviceMetrics] = None):
         if "http" in host:
             raise ValueError("Hostname should not contain 'http://' or 'https://'")
         self.base_url = f"http://{host}"
         self.username = username
         self.password = password
         self.stok = None
-        self.session = requests.Session()
-        _LOGGER.info(f"TPIPC client initialized for host: {self.base_url}")
+        self.device_info: Optional[Dict[str, Any]] = None
+        self._stok_time = 0.0
+        self._login_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.stats = TPIPCClientStats()
+        self.breaker = CircuitBreaker(host)
+        self.metrics = metrics or DeviceMetrics()
+        _LOGGER.debug("TPIPC client initialized for host: %s", self.base_url)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Return the pooled keep-alive session for this host, creating it lazily."""
+        if self._session is None or self._session.closed:
+            # One camera only ever sees a handful of concurrent calls; a small
+            # per-host pool keeps the connection warm without hogging sockets.
+            connector = aiohttp.TCPConnector(limit_per_host=4, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.HEADERS)
+        return self._session
+
+    async def close(self) -> None:
+        """Close the underlying HTTP session."""
+        for task in (self._login_task, self._refresh_task):
+            if task is not None and not task.done():
+                task.cancel()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _post_json(self, url: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """POST a JSON payload and decode the JSON reply."""
+        async with self.session.post(
+            url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            response.raise_for_status()
+            # The firmware does not always label its replies as JSON.
+            return await response.json(content_type=None)
 
-    def _get_nonce(self) -> str:
+    async def _get_nonce(self) -> str:
         """Get nonce from the device."""
         url = f"{self.base_url}/pc/Content.htm"
         try:
-            response = requests.get(url, timeout=5)
-            # response.raise_for_status()
-            data = response.json()
-            nonce = data.get("data", {}).get("nonce")
-            if not nonce:
-                raise TPIPCApiError("Failed to get nonce from device.", data)
-            return nonce
-        except requests.RequestException as e:
-            raise TPIPCApiError(f"Network error while getting nonce: {e}") from e
+            async with self.session.get(
+                url, timeout=aiohttp.ClientTimeout(total=NONCE_TIMEOUT)
+            ) as response:
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise TPIPCConnectionError(f"Network error while getting nonce: {e}") from e
+        nonce = data.get("data", {}).get("nonce")
+        if not nonce:
+            raise TPIPCApiError("Failed to get nonce from device.", data)
+        return nonce
 
     def _encrypt_password(self, nonce: str) -> str:
         """Encrypt password with nonce."""
         return hashlib.md5(f"{self.password}:{nonce}".encode("utf-8")).hexdigest()
 
-    def _login(self):
+    async def _login(self):
         """Login to the device to get a stok."""
-        _LOGGER.info("Attempting to login...")
-        nonce = self._get_nonce()
+        _LOGGER.debug("Attempting to login to %s", self.base_url)
+        nonce = await self._get_nonce()
         encrypted_password = self._encrypt_password(nonce)
         url = f"{self.base_url}/"
         payload = {
@@ -62,54 +214,179 @@ class TPLinkIPCApiClient:
             }
         }
         try:
-            response = self.session.post(url, json=payload, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            stok = data.get("stok")
-            if not stok:
-                raise TPIPCApiError("Login failed: 'stok' not found in response.", data)
-            self.stok = stok
-            _LOGGER.info("Login successful, STOK cached.")
-        except requests.RequestException as e:
-            raise TPIPCApiError(f"Network error during login: {e}") from e
-
-    def request(self, payload: Dict[str, Any], retry: bool = True) -> Dict[str, Any]:
+            data = await self._post_json(url, payload, LOGIN_TIMEOUT)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise TPIPCConnectionError(f"Network error during login: {e}") from e
+        stok = data.get("stok")
+        if not stok:
+            raise TPIPCApiError("Login failed: 'stok' not found in response.", data)
+        self.stok = stok
+        self._stok_time = time.monotonic()
+        _LOGGER.debug("Login to %s successful, STOK cached.", self.base_url)
+
+    async def _run_login(self):
+        """Run a login and record its outcome."""
+        self.stats.logins += 1
+        started = time.monotonic()
+        try:
+            await self._login()
+        except BaseException:
+            self.stats.login_failures += 1
+            raise
+        else:
+            self.metrics.login_latency.observe(time.monotonic() - started)
+        finally:
+            self._login_task = None
+
+    async def _ensure_login(self):
+        """Log in, sharing a single in-flight login between all callers."""
+        if self._login_task is None:
+            self._login_task = asyncio.ensure_future(self._run_login())
+        started = time.monotonic()
+        try:
+            # Shield so a cancelled caller does not abort the login others wait on.
+            await asyncio.shield(self._login_task)
+        finally:
+            waited = time.monotonic() - started
+            self.stats.login_waits += 1
+            self.stats.login_wait_total += waited
+            self.stats.login_wait_max = max(self.stats.login_wait_max, waited)
+
+    def _schedule_refresh(self):
+        """Refresh an ageing stok in the background without blocking the caller."""
+        if self._login_task is not None:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self.stats.background_refreshes += 1
+        self._refresh_task = asyncio.ensure_future(self._background_refresh())
+
+    async def _background_refresh(self):
+        try:
+            await self._ensure_login()
+        except TPIPCApiError as err:
+            # The current stok is still usable; the next request retries on -40401.
+            _LOGGER.debug("Background stok refresh for %s failed: %s", self.base_url, err)
+
+    async def _probe(self):
+        """Check with one cheap unauthenticated request that the device answers."""
+        url = f"{self.base_url}/pc/Content.htm"
+        try:
+            async with self.session.get(
+                url, timeout=aiohttp.ClientTimeout(total=PROBE_TIMEOUT)
+            ) as response:
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise TPIPCConnectionError(f"Device still unreachable: {e}") from e
+
+    async def _check_breaker(self):
+        """Fail fast while the device is unreachable, probing once per backoff period."""
+        breaker = self.breaker
+        if breaker.state == CircuitBreaker.CLOSED:
+            return
+        if not breaker.try_begin_probe():
+            raise TPIPCUnavailableError(
+                f"{self.base_url} is unreachable; next attempt in {breaker.retry_in:.0f}s"
+            )
+        try:
+            await self._probe()
+        except TPIPCConnectionError:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Left half-open, the circuit would reject every later call for good.
+            breaker.abort_probe()
+            raise
+        breaker.record_success()
+
+    async def request(self, payload: Dict[str, Any], retry: bool = True) -> Dict[str, Any]:
         """Send a request to the device."""
+        await self._check_breaker()
+        started = time.monotonic()
+        try:
+            data = await self._request(payload, retry)
+        except TPIPCApiError as err:
+            self.metrics.request_failures += 1
+            if isinstance(err, TPIPCConnectionError):
+                self.breaker.record_failure()
+            raise
+        finally:
+            self.metrics.request_latency.observe(time.monotonic() - started)
+        self.breaker.record_success()
+        return data
+
+    async def _request(self, payload: Dict[str, Any], retry: bool) -> Dict[str, Any]:
         if not self.stok:
-            self._login()
-        
-        url = f"{self.base_url}/stok={self.stok}/ds"
+            await self._ensure_login()
+        elif time.monotonic() - self._stok_time > STOK_REFRESH_AFTER:
+            self._schedule_refresh()
+
+        stok = self.stok
+        url = f"{self.base_url}/stok={stok}/ds"
         try:
-            headers = {"Content-Type": "application/json; charset=utf-8", "User-Agent": "TP-LINK_APP"}
-            response = self.session.post(url, json=payload, timeout=10, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            error_code = data.get("error_code", 0)
+            data = await self._post_json(url, payload, REQUEST_TIMEOUT)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise TPIPCConnectionError(f"Network error during request: {e}") from e
+        error_code = data.get("error_code", 0)
 
-            if error_code == -40401 and retry:
-                _LOGGER.warning("STOK expired or invalid. Re-logging in and retrying request.")
+        if error_code == -40401 and retry:
+            _LOGGER.warning("STOK expired or invalid. Re-logging in and retrying request.")
+            self.stats.stok_retries += 1
+            # Only drop the stok we used; another caller may already have replaced it.
+            if self.stok == stok:
                 self.stok = None
-                return self.request(payload, retry=False)
-            
-            if error_code != 0:
-                 _LOGGER.warning(f"API returned error: {data}")
+            return await self._request(payload, retry=False)
 
-            return data
-        except requests.RequestException as e:
-            raise TPIPCApiError(f"Network error during request: {e}") from e
+        if error_code != 0:
+            _LOGGER.warning("API returned error: %s", data)
 
-    def get_lens_mask_status(self) -> bool:
-        """Get the current status of the lens mask."""
-        result = self.request(self.PAYLOAD_GET_LENSMASK)
+        return data
+
+    async def get_modules(self, modules: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Read several ``ds`` modules in a single batched "get" request."""
+        payload: Dict[str, Any] = {"method": "get"}
+        for module, names in modules.items():
+            payload[module] = {"name": list(names)}
+        return await self.request(payload)
+
+    async def get_modules_and_device_info(self, modules: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Like get_modules, piggybacking the device info until it has been read once."""
+        if self.device_info is not None:
+            return await self.get_modules(modules)
+        result = await self.get_modules({**modules, "device_info": ["basic_info"]})
+        if result.get("error_code", 0) != 0:
+            # Firmware without the section rejects the whole batch; stop asking.
+            self.device_info = {}
+            return await self.get_modules(modules)
+        if not self.update_device_info(result):
+            self.device_info = {}
+        return result
+
+    def update_device_info(self, result: Dict[str, Any]) -> bool:
+        """Cache the ``device_info`` section of a "get" response; True if it was new."""
+        info = result.get("device_info", {}).get("basic_info")
+        if not info or info == self.device_info:
+            return False
+        self.device_info = info
+        return True
+
+    @staticmethod
+    def parse_lens_mask_status(result: Dict[str, Any]) -> bool:
+        """Extract the lens mask state from a "get" response."""
         status = result.get("lens_mask", {}).get("lens_mask_info", {}).get("enabled")
         if status is None:
             raise TPIPCApiError("Could not determine lens mask status from response.", result)
         return status == "on"
 
-    def set_lens_mask_on(self) -> Dict[str, Any]:
+    async def get_lens_mask_status(self) -> bool:
+        """Get the current status of the lens mask."""
+        result = await self.get_modules_and_device_info({"lens_mask": ["lens_mask_info"]})
+        return self.parse_lens_mask_status(result)
+
+    async def set_lens_mask_on(self) -> Dict[str, Any]:
         """Enable the lens mask (privacy on)."""
-        return self.request(self.PAYLOAD_SET_LENSMASK_ON)
+        return await self.request(self.PAYLOAD_SET_LENSMASK_ON)
 
-    def set_lens_mask_off(self) -> Dict[str, Any]:
+    async def set_lens_mask_off(self) -> Dict[str, Any]:
         """Disable the lens mask (privacy off)."""
-        return self.request(self.PAYLOAD_SET_LENSMASK_OFF)
\ No newline at end of file
+        return await self.request(self.PAYLOAD_SET_LENSMASK_OFF)
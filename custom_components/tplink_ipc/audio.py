@@ -0,0 +1,189 @@
+"""In-process audio conversion for talkback: WAV/PCM, or MP3 with PyAV, to G.711 A-law RTP."""
+import io
+import random
+import struct
+import wave
+from itertools import accumulate
+from typing import List
+
+try:
+    # PyAV comes with Home Assistant's stream integration; without it MP3
+    # clips such as TTS announcements go through ffmpeg instead.
+    import av
+except ImportError:
+    av = None
+
+SAMPLE_RATE = 8000
+# 20 ms of 8 kHz mono A-law per RTP packet, matching what ffmpeg sends.
+SAMPLES_PER_PACKET = 160
+PAYLOAD_TYPE_PCMA = 8
+ALAW_SILENCE = 0xD5
+
+_SEG_END = (0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF)
+
+
+def _linear_to_alaw(sample: int) -> int:
+    """Encode one signed 16-bit sample as A-law (ITU-T G.711)."""
+    pcm = sample >> 3
+    if pcm >= 0:
+        mask = 0xD5
+    else:
+        mask = 0x55
+        pcm = -pcm - 1
+    for seg, end in enumerate(_SEG_END):
+        if pcm <= end:
+            break
+    else:
+        return 0x7F ^ mask
+    aval = seg << 4
+    aval |= (pcm >> (1 if seg < 2 else seg)) & 0x0F
+    return aval ^ mask
+
+
+# Indexed by the sample reinterpreted as unsigned 16-bit, so a whole buffer can
+# be encoded with a single C-level map() over a memoryview.
+_ALAW_TABLE = bytes(_linear_to_alaw(i - 0x10000 if i & 0x8000 else i) for i in range(0x10000))
+
+
+class UnsupportedAudioError(Exception):
+    """The source cannot be decoded in-process; use the ffmpeg path instead."""
+
+
+def is_wav(data: bytes) -> bool:
+    """Return whether the data looks like a RIFF/WAVE file."""
+    return len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+
+def is_mp3(data: bytes) -> bool:
+    """Return whether the data starts with an ID3 tag or an MPEG audio frame."""
+    if data[:3] == b"ID3":
+        return True
+    # Frame sync plus a layer; AAC's ADTS header has the same sync but layer 0.
+    return len(data) >= 2 and data[0] == 0xFF and data[1] & 0xE0 == 0xE0 and data[1] & 0x06 != 0
+
+
+def can_decode(head: bytes) -> bool:
+    """Return whether a clip starting with head can be converted in-process."""
+    return is_wav(head) or (av is not None and is_mp3(head))
+
+
+def decode_wav(data: bytes):
+    """Decode PCM WAV data into (mono signed 16-bit samples, sample rate)."""
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as err:
+        raise UnsupportedAudioError(f"Unsupported WAV data: {err}") from err
+
+    if width == 2:
+        samples = memoryview(frames).cast("h").tolist()
+    elif width == 1:
+        samples = [(b - 128) << 8 for b in frames]
+    elif width in (3, 4):
+        # Keep the two most significant bytes of each little-endian sample.
+        samples = [
+            struct.unpack_from("<h", frames, i + width - 2)[0]
+            for i in range(0, len(frames) - width + 1, width)
+        ]
+    else:
+        raise UnsupportedAudioError(f"Unsupported sample width: {width}")
+
+    if channels > 1:
+        samples = [
+            sum(samples[i:i + channels]) // channels
+            for i in range(0, len(samples) - channels + 1, channels)
+        ]
+    return samples, rate
+
+
+def resample(samples: List[int], rate: int, target: int = SAMPLE_RATE) -> List[int]:
+    """Resample mono samples, box-filtering on the way down to limit aliasing."""
+    if rate == target or not samples:
+        return samples
+    count = len(samples) * target // rate
+    ratio = rate / target
+    if ratio > 1:
+        prefix = [0, *accumulate(samples)]
+        bounds = [min(int(i * ratio), len(samples)) for i in range(count + 1)]
+        return [
+            (prefix[end] - prefix[start]) // (end - start) if end > start else 0
+            for start, end in zip(bounds, bounds[1:])
+        ]
+    return [samples[min(int(i * ratio), len(samples) - 1)] for i in range(count)]
+
+
+def _encode_pcm(pcm: bytes) -> bytes:
+    """Encode little-endian signed 16-bit PCM as G.711 A-law."""
+    return bytes(map(_ALAW_TABLE.__getitem__, memoryview(pcm).cast("H")))
+
+
+def encode_alaw(samples: List[int]) -> bytes:
+    """Encode signed 16-bit samples as G.711 A-law."""
+    return _encode_pcm(struct.pack(f"<{len(samples)}h", *samples))
+
+
+def wav_to_alaw(data: bytes) -> bytes:
+    """Convert a WAV file to 8 kHz mono A-law."""
+    samples, rate = decode_wav(data)
+    return encode_alaw(resample(samples, rate))
+
+
+def mp3_to_alaw(data: bytes) -> bytes:
+    """Convert an MP3 file to 8 kHz mono A-law with PyAV."""
+    if av is None:
+        raise UnsupportedAudioError("PyAV is not installed")
+    pcm = bytearray()
+    try:
+        with av.open(io.BytesIO(data), format="mp3") as container:
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+            for frame in container.decode(audio=0):
+                for resampled in resampler.resample(frame):
+                    pcm += bytes(resampled.planes[0])[:resampled.samples * 2]
+            for resampled in resampler.resample(None):
+                pcm += bytes(resampled.planes[0])[:resampled.samples * 2]
+    except (av.FFmpegError, ValueError) as err:
+        raise UnsupportedAudioError(f"Unsupported MP3 data: {err}") from err
+    return _encode_pcm(bytes(pcm))
+
+
+def to_alaw(data: bytes) -> bytes:
+    """Convert a WAV or MP3 file to 8 kHz mono A-law."""
+    if is_wav(data):
+        return wav_to_alaw(data)
+    if is_mp3(data):
+        return mp3_to_alaw(data)
+    raise UnsupportedAudioError("Not a WAV or MP3 file")
+
+
+def alaw_silence(duration_ms: int) -> bytes:
+    """Return A-law silence of the given duration."""
+    return bytes([ALAW_SILENCE]) * (SAMPLE_RATE * duration_ms // 1000)
+
+
+class RtpPacketizer:
+    """Split A-law audio into PCMA RTP packets, continuing seq/timestamp across clips."""
+
+    def __init__(self):
+        self._ssrc = random.getrandbits(32)
+        self._seq = random.getrandbits(16)
+        self._timestamp = random.getrandbits(32)
+
+    def packetize(self, alaw: bytes, marker: bool = True) -> List[bytes]:
+        """Return the RTP packets for one clip; the first one carries the marker bit.
+
+        Pass marker=False for later pieces of a clip that is packetized as it streams in.
+        """
+        packets = []
+        for offset in range(0, len(alaw), SAMPLES_PER_PACKET):
+            payload = alaw[offset:offset + SAMPLES_PER_PACKET]
+            marker_bit = 0x80 if marker and offset == 0 else 0
+            header = struct.pack(
+                "!BBHII", 0x80, marker_bit | PAYLOAD_TYPE_PCMA, self._seq, self._timestamp, self._ssrc
+            )
+            packets.append(header + payload)
+            self._seq = (self._seq + 1) & 0xFFFF
+            self._timestamp = (self._timestamp + len(payload)) & 0xFFFFFFFF
+        return packets
@@ -0,0 +1,227 @@
+"""Bounded cache of pre-encoded announcements for talkback."""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+_LOGGER = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+# Query parameters that change on every media-source resolution of the same file.
+_VOLATILE_PARAMS = {"authSig"}
+
+
+def response_validator(headers: Mapping[str, str]) -> Optional[str]:
+    """Identify the version of a source from its HTTP response headers.
+
+    Uses the ETag if there is one, otherwise Last-Modified and Content-Length.
+    None means the response carries nothing to revalidate against, and the
+    clip is not cached.
+    """
+    etag = headers.get("ETag")
+    if etag:
+        return f"etag:{etag}"
+    last_modified = headers.get("Last-Modified")
+    length = headers.get("Content-Length")
+    if not last_modified and not length:
+        return None
+    return f"modified:{last_modified or ''};length:{length or ''}"
+
+
+def cache_key(media_url: str) -> str:
+    """Normalize a resolved media URL so re-signed links map to the same entry."""
+    parsed = urlparse(media_url)
+    query = [(k, v) for k, v in parse_qsl(parsed.query) if k not in _VOLATILE_PARAMS]
+    return urlunparse(parsed._replace(query=urlencode(query)))
+
+
+class AnnouncementCache:
+    """LRU cache of 8 kHz A-law payloads keyed by media URL and content hash.
+
+    Entries are indexed by URL and stored by the hash of their encoded audio,
+    so several URLs for the same clip share one blob. Blobs live on disk (when
+    a directory is given) and the most recent ones are also kept in memory.
+    Each URL is stored with a validator taken from the source's HTTP headers
+    (see response_validator); a lookup with a different validator is a miss,
+    so a replaced file is fetched again. All methods are blocking and safe to
+    call from executor threads.
+    """
+
+    def __init__(self, directory: Optional[str], max_bytes: int, memory_max_bytes: int):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._memory_max_bytes = memory_max_bytes
+        self._lock = threading.Lock()
+        self._urls: Dict[str, str] = {}
+        # URL -> validator of the source the entry was encoded from
+        self._validators: Dict[str, str] = {}
+        # content hash -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        if directory:
+            self._load_index()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._entries.values())
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self._directory, f"{content_hash}.alaw")
+
+    def _load_index(self):
+        os.makedirs(self._directory, exist_ok=True)
+        try:
+            with open(os.path.join(self._directory, INDEX_FILE), encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        for content_hash, size in index.get("entries", []):
+            if os.path.exists(self._blob_path(content_hash)):
+                self._entries[content_hash] = size
+        validators = index.get("validators", {})
+        # Entries saved without a validator cannot be revalidated and are dropped.
+        self._urls = {
+            url: content_hash
+            for url, content_hash in index.get("urls", {}).items()
+            if content_hash in self._entries and url in validators
+        }
+        self._validators = {url: validators[url] for url in self._urls}
+
+    def _save_index(self):
+        if not self._directory:
+            return
+        index = {
+            "entries": list(self._entries.items()),
+            "urls": self._urls,
+            "validators": self._validators,
+        }
+        path = os.path.join(self._directory, INDEX_FILE)
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            _LOGGER.warning("Failed to save announcement cache index: %s", e)
+
+    def _remember(self, content_hash: str, alaw: bytes):
+        self._memory[content_hash] = alaw
+        self._memory.move_to_end(content_hash)
+        self._memory_bytes += len(alaw)
+        while self._memory_bytes > self._memory_max_bytes and len(self._memory) > 1:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_bytes -= len(dropped)
+
+    def _forget(self, content_hash: str):
+        dropped = self._memory.pop(content_hash, None)
+        if dropped is not None:
+            self._memory_bytes -= len(dropped)
+
+    def get(self, media_url: str, validator: str) -> Optional[bytes]:
+        """Return the encoded audio for a URL, or None on a miss.
+
+        validator identifies the source as it is now; an entry encoded from
+        a different version of it is dropped.
+        """
+        key = cache_key(media_url)
+        with self._lock:
+            content_hash = self._urls.get(key)
+            if content_hash is not None and self._validators.get(key) != validator:
+                self.stale += 1
+                self._urls.pop(key)
+                self._validators.pop(key, None)
+                if content_hash not in self._urls.values():
+                    self._entries.pop(content_hash, None)
+                    self._delete(content_hash)
+                self._save_index()
+                content_hash = None
+            alaw = None
+            if content_hash is not None:
+                alaw = self._memory.get(content_hash)
+                if alaw is None and self._directory:
+                    try:
+                        with open(self._blob_path(content_hash), "rb") as f:
+                            alaw = f.read()
+                        self._remember(content_hash, alaw)
+                    except OSError:
+                        self._entries.pop(content_hash, None)
+                        self._urls.pop(key, None)
+                        self._validators.pop(key, None)
+            if alaw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(content_hash)
+            self._memory.move_to_end(content_hash)
+            return alaw
+
+    def put(self, media_url: str, alaw: bytes, validator: str):
+        """Store encoded audio for a URL, evicting least recently used clips."""
+        if not alaw or len(alaw) > self._max_bytes:
+            return
+        content_hash = hashlib.sha256(alaw).hexdigest()
+        with self._lock:
+            key = cache_key(media_url)
+            self._urls[key] = content_hash
+            self._validators[key] = validator
+            if content_hash not in self._entries and self._directory:
+                try:
+                    with open(self._blob_path(content_hash), "wb") as f:
+                        f.write(alaw)
+                except OSError as e:
+                    _LOGGER.warning("Failed to write announcement cache entry: %s", e)
+            self._entries[content_hash] = len(alaw)
+            self._entries.move_to_end(content_hash)
+            if content_hash not in self._memory:
+                self._remember(content_hash, alaw)
+            while self.total_bytes > self._max_bytes:
+                self._evict_oldest()
+            self._save_index()
+
+    def resize(self, max_bytes: int):
+        """Change the size limit, evicting clips down to it; 0 empties the cache."""
+        with self._lock:
+            self._max_bytes = max_bytes
+            if self.total_bytes > max_bytes:
+                while self.total_bytes > max_bytes:
+                    self._evict_oldest()
+                self._save_index()
+
+    def _evict_oldest(self):
+        content_hash, _ = self._entries.popitem(last=False)
+        self._urls = {u: h for u, h in self._urls.items() if h != content_hash}
+        self._validators = {u: v for u, v in self._validators.items() if u in self._urls}
+        self.evictions += 1
+        self._delete(content_hash)
+
+    def _delete(self, content_hash: str):
+        """Remove a blob that is no longer in the index from memory and disk."""
+        self._forget(content_hash)
+        if self._directory:
+            try:
+                os.remove(self._blob_path(content_hash))
+            except OSError:
+                pass
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return counters for diagnostics."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "urls": len(self._urls),
+                "bytes": self.total_bytes,
+                "max_bytes": self._max_bytes,
+                "memory_bytes": self._memory_bytes,
+            }
@@ -3,10 +3,17 @@ import logging
 
 from homeassistant import config_entries
 from homeassistant.const import CONF_HOST, CONF_USERNAME, CONF_PASSWORD
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 
-from .api import TPLinkIPCApiClient, TPIPCApiError
-from .const import DOMAIN
+from .api import TPIPCApiError
+from .const import (
+    CONF_AUDIO_CACHE_MB,
+    CONF_LEAD_IN_MS,
+    DEFAULT_AUDIO_CACHE_MB,
+    DEFAULT_LEAD_IN_MS,
+    DOMAIN,
+)
+from .registry import async_get_registry
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,15 +27,14 @@ DATA_SCHEMA = vol.Schema(
 
 async def validate_input(hass: HomeAssistant, data: dict) -> dict:
     """Validate the user input allows us to connect."""
-    client = TPLinkIPCApiClient(
-        host=data[CONF_HOST],
-        username=data[CONF_USERNAME],
-        password=data[CONF_PASSWORD],
+    # Borrow the shared client so the entry set up next reuses its login.
+    client = async_get_registry(hass).async_borrow(
+        data[CONF_HOST], data[CONF_USERNAME], data[CONF_PASSWORD]
     )
-    
+
     # Test connection by trying to get the lens mask status
-    await hass.async_add_executor_job(client.get_lens_mask_status)
-    
+    await client.get_lens_mask_status()
+
     # If we got here, the connection is successful
     return {"title": f"TP-Link Camera ({data[CONF_HOST]})"}
 
@@ -38,6 +44,12 @@ class TPLinkIPCCameraConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow for this handler."""
+        return TPLinkIPCOptionsFlow()
+
     async def async_step_user(self, user_input=None):
         """Handle the initial step."""
         errors = {}
@@ -54,4 +66,26 @@ class TPLinkIPCCameraConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         return self.async_show_form(
             step_id="user", data_schema=DATA_SCHEMA, errors=errors
-        )
\ No newline at end of file
+        )
+
+class TPLinkIPCOptionsFlow(config_entries.OptionsFlow):
+    """Handle per-camera tuning options."""
+
+    async def async_step_init(self, user_input=None):
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        lead_in_ms = self.config_entry.options.get(CONF_LEAD_IN_MS, DEFAULT_LEAD_IN_MS)
+        cache_mb = self.config_entry.options.get(CONF_AUDIO_CACHE_MB, DEFAULT_AUDIO_CACHE_MB)
+        schema = vol.Schema(
+            {
+                vol.Required(CONF_LEAD_IN_MS, default=lead_in_ms): vol.All(
+                    vol.Coerce(int), vol.Range(min=0, max=5000)
+                ),
+                vol.Required(CONF_AUDIO_CACHE_MB, default=cache_mb): vol.All(
+                    vol.Coerce(int), vol.Range(min=0, max=1024)
+                ),
+            }
+        )
+        return self.async_show_form(step_id="init", data_schema=schema)
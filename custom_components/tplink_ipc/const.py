@@ -1,4 +1,21 @@
 """Constants for the TP-Link IPC integration."""
+from datetime import timedelta
 
 DOMAIN = "tplink_ipc"
-PLATFORMS = ["switch", "media_player"]
\ No newline at end of file
+PLATFORMS = ["switch", "media_player", "sensor"]
+
+DEFAULT_SCAN_INTERVAL = timedelta(seconds=30)
+# While a camera's state stays the same the poll interval doubles up to this.
+MAX_SCAN_INTERVAL = timedelta(minutes=5)
+
+CONF_LEAD_IN_MS = "lead_in_ms"
+# Silence prepended to each announcement to prime the camera's jitter buffer.
+DEFAULT_LEAD_IN_MS = 300
+CONF_AUDIO_CACHE_MB = "audio_cache_mb"
+# Disk space for pre-encoded announcements, shared by every camera.
+DEFAULT_AUDIO_CACHE_MB = 50
+
+DATA_AUDIO_CACHE = f"{DOMAIN}_audio_cache"
+DATA_CLIENT_REGISTRY = f"{DOMAIN}_clients"
+AUDIO_CACHE_DIR = "tplink_ipc_audio"
+AUDIO_CACHE_MEMORY_BYTES = 8 * 1024 * 1024
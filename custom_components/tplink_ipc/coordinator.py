@@ -0,0 +1,219 @@
+"""Data update coordinator for the TP-Link IPC Camera integration."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Callable
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .api import TPLinkIPCApiClient, TPIPCApiError
+from .const import DEFAULT_SCAN_INTERVAL, DOMAIN, MAX_SCAN_INTERVAL
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TPIPCWriteTimeoutError(TPIPCApiError):
+    """A write did not finish in time.
+
+    ``sent`` is False if the write was withdrawn before reaching the camera
+    and True if it was already on its way, so its outcome is unknown.
+    """
+
+    def __init__(self, message: str, sent: bool) -> None:
+        super().__init__(message)
+        self.sent = sent
+
+
+class TPLinkIPCDataUpdateCoordinator(DataUpdateCoordinator[dict[str, Any]]):
+    """Poll a camera with one batched "get" covering every registered entity.
+
+    The cameras do not push state changes, so polling adapts instead: every
+    poll that returns the same data doubles the interval up to
+    MAX_SCAN_INTERVAL, and a change, a new read or a write through the
+    integration drops it back to DEFAULT_SCAN_INTERVAL.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, client: TPLinkIPCApiClient, config_entry: ConfigEntry
+    ) -> None:
+        """Initialize the coordinator."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            config_entry=config_entry,
+            name=f"{DOMAIN} {config_entry.title}",
+            update_interval=DEFAULT_SCAN_INTERVAL,
+        )
+        self.client = client
+        # (module, name) -> number of entities interested in it
+        self._reads: Counter[tuple[str, str]] = Counter()
+        # setting key -> (latest "set" payload, callers waiting on it)
+        self._pending_writes: dict[str, tuple[dict[str, Any], list[asyncio.Future]]] = {}
+        self._writer: asyncio.Task | None = None
+        self._device_registry_synced = False
+
+    def register_read(self, module: str, name: str) -> Callable[[], None]:
+        """Add a ``ds`` module section to the batched poll; returns an unregister callback."""
+        key = (module, name)
+        self._reads[key] += 1
+        self.update_interval = DEFAULT_SCAN_INTERVAL
+
+        def _unregister() -> None:
+            self._reads[key] -= 1
+            if self._reads[key] <= 0:
+                del self._reads[key]
+
+        return _unregister
+
+    def _build_modules(self) -> dict[str, list[str]]:
+        """Merge all registered reads into a module -> names mapping."""
+        modules: dict[str, list[str]] = {}
+        for module, name in sorted(self._reads):
+            modules.setdefault(module, []).append(name)
+        return modules
+
+    async def async_refresh_after_change(self) -> None:
+        """Confirm a write right away and resume fast polling.
+
+        This reads immediately instead of going through the debounced
+        async_request_refresh, whose cooldown would leave entities showing
+        a superseded state after back-to-back writes.
+        """
+        self.update_interval = DEFAULT_SCAN_INTERVAL
+        await self.async_refresh()
+
+    async def async_write(
+        self, key: str, payload: dict[str, Any], timeout: float | None = None
+    ) -> None:
+        """Send a "set" for one setting through the device's write queue.
+
+        Writes are sent one at a time. A write still waiting in the queue is
+        replaced by a newer one for the same key, so bursts of toggles only
+        send the last desired state; every superseded caller gets the outcome
+        of that final write. Raises TPIPCApiError if it fails.
+
+        A caller that times out or is cancelled stops waiting; if nobody else
+        waits on the queued write it is dropped rather than applied later.
+        On timeout TPIPCWriteTimeoutError tells whether it was already sent.
+        """
+        future = self.hass.loop.create_future()
+        _, waiters = self._pending_writes.pop(key, (None, []))
+        waiters.append(future)
+        self._pending_writes[key] = (payload, waiters)
+        if self._writer is None or self._writer.done():
+            self._writer = self.config_entry.async_create_background_task(
+                self.hass, self._async_process_writes(), f"{self.name} writes"
+            )
+        try:
+            async with asyncio.timeout(timeout):
+                await future
+        except (asyncio.CancelledError, TimeoutError) as err:
+            sent = not self._async_withdraw_write(key, future)
+            if isinstance(err, TimeoutError):
+                raise TPIPCWriteTimeoutError(
+                    f"Timed out after {timeout:g} s", sent
+                ) from err
+            raise
+
+    def _async_withdraw_write(self, key: str, future: asyncio.Future) -> bool:
+        """Take a caller off a queued write; False if the write was already taken to send."""
+        pending = self._pending_writes.get(key)
+        if pending is None or future not in pending[1]:
+            return False
+        pending[1].remove(future)
+        if not pending[1]:
+            del self._pending_writes[key]
+        return True
+
+    async def _async_process_writes(self) -> None:
+        """Drain the write queue, confirming the result with a read each time it empties.
+
+        Writes queued while the confirming read runs are picked up by the
+        next pass, as async_write only starts a new writer once this one is
+        done. Every caller is answered, even if the writer fails or is
+        cancelled.
+        """
+        waiters: list[asyncio.Future] = []
+        try:
+            while self._pending_writes:
+                while self._pending_writes:
+                    key = next(iter(self._pending_writes))
+                    payload, waiters = self._pending_writes.pop(key)
+                    try:
+                        data = await self.client.request(payload)
+                        if data.get("error_code", 0) != 0:
+                            raise TPIPCApiError(
+                                f"Camera rejected the change: {data}", data.get("error_code")
+                            )
+                    except Exception as err:  # pylint: disable=broad-except
+                        if not isinstance(err, TPIPCApiError):
+                            err = TPIPCApiError(f"Failed to send the change: {err}")
+                        _async_fail_waiters(waiters, err)
+                    else:
+                        for waiter in waiters:
+                            if not waiter.done():
+                                waiter.set_result(None)
+                    waiters = []
+                await self.async_refresh_after_change()
+        finally:
+            for _, pending in self._pending_writes.values():
+                waiters.extend(pending)
+            self._pending_writes.clear()
+            _async_fail_waiters(
+                waiters, TPIPCApiError("The write queue stopped before the change was sent.")
+            )
+
+    def _adapt_interval(self, data: dict[str, Any]) -> None:
+        """Back off while the polled state is stable; reset when it changes."""
+        if data != self.data or self.update_interval is None:
+            self.update_interval = DEFAULT_SCAN_INTERVAL
+        else:
+            self.update_interval = min(self.update_interval * 2, MAX_SCAN_INTERVAL)
+
+    async def _async_update_data(self) -> dict[str, Any]:
+        """Fetch every registered module section in a single request."""
+        modules = self._build_modules()
+        if not modules:
+            return {}
+        try:
+            data = await self.client.get_modules_and_device_info(modules)
+        except TPIPCApiError as err:
+            self.update_interval = DEFAULT_SCAN_INTERVAL
+            raise UpdateFailed(f"Failed to communicate with camera: {err}") from err
+        if data.get("error_code", 0) != 0:
+            raise UpdateFailed(f"Camera returned error: {data}")
+        if not self._device_registry_synced:
+            self._async_update_device_registry()
+        self._adapt_interval(data)
+        return data
+
+    def _async_update_device_registry(self) -> None:
+        """Record the model and firmware reported by the camera on its device."""
+        info = self.client.device_info
+        if not info:
+            return
+        device_registry = dr.async_get(self.hass)
+        device = device_registry.async_get_device(
+            identifiers={(DOMAIN, self.config_entry.unique_id or self.config_entry.entry_id)}
+        )
+        if device is None:
+            return
+        self._device_registry_synced = True
+        device_registry.async_update_device(
+            device.id,
+            model=info.get("device_model") or device.model,
+            sw_version=info.get("sw_version") or device.sw_version,
+            hw_version=info.get("hw_version") or device.hw_version,
+        )
+
+
+def _async_fail_waiters(waiters: list[asyncio.Future], err: TPIPCApiError) -> None:
+    """Hand a write failure to every caller still waiting on it."""
+    for waiter in waiters:
+        if not waiter.done():
+            waiter.set_exception(err)
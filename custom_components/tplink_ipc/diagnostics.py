@@ -0,0 +1,39 @@
+"""Diagnostics support for the TP-Link IPC Camera integration."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD
+from homeassistant.core import HomeAssistant
+
+from .const import DATA_AUDIO_CACHE, DOMAIN
+from .models import TPLinkCameraData
+
+TO_REDACT = {CONF_PASSWORD}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    camera_data: TPLinkCameraData = hass.data[DOMAIN][entry.entry_id]
+    cache = hass.data.get(DATA_AUDIO_CACHE)
+    last_timings = camera_data.talkback_client.last_timings
+    last_pacing = camera_data.talkback_client.last_pacing
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "api_client": camera_data.api_client.stats.as_dict(),
+        "circuit_breaker": camera_data.api_client.breaker.as_dict(),
+        "metrics": camera_data.metrics.as_dict(),
+        "talkback": {
+            "last_timings": vars(last_timings) if last_timings else None,
+            "last_pacing": last_pacing.as_dict() if last_pacing else None,
+        },
+        "announcement_cache": cache.as_dict() if cache else None,
+    }
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import logging
 from urllib.parse import urljoin
 
@@ -21,10 +23,23 @@ from homeassistant.helpers.network import get_url
 
 from .const import DOMAIN
 from .models import TPLinkCameraData
-from .talkback import TPLinkTalkbackPlayer
+from .talkback import (
+    PRIORITY_ALARM,
+    PRIORITY_ANNOUNCE,
+    PRIORITY_NORMAL,
+    PlaybackQueueFull,
+    TPLinkTalkbackPlayer,
+)
 from typing import Any
 _LOGGER = logging.getLogger(__name__)
 
+# Values accepted for "priority" in the play_media "extra" data.
+PRIORITIES = {
+    "normal": PRIORITY_NORMAL,
+    "announce": PRIORITY_ANNOUNCE,
+    "alarm": PRIORITY_ALARM,
+}
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -38,6 +53,36 @@ async def async_setup_entry(
     async_add_entities([player_entity])
 
 
+async def async_resolve_media_url(
+    hass: HomeAssistant, media_id: str, entity_id: str | None = None
+) -> str | None:
+    """Resolve a media_source ID or path to an absolute URL ffmpeg can open."""
+    media_url = None
+    if is_media_source_id(media_id):
+        try:
+            resolved_media = await async_resolve_media(hass, media_id, entity_id)
+            media_url = resolved_media.url
+            _LOGGER.info("Resolved media ID to playable URL: %s", media_url)
+        except HomeAssistantError as err:
+            _LOGGER.error("Failed to resolve media source: %s", err)
+            return None
+    else:
+        media_url = media_id
+        _LOGGER.info("Received direct media path: %s", media_url)
+
+    if not media_url:
+        _LOGGER.error("Could not determine a valid media URL.")
+        return None
+
+    if media_url.startswith("/"):
+        base_url = get_url(hass)
+        absolute_url = urljoin(base_url, media_url)
+        _LOGGER.info("Converted relative path to absolute URL: %s", absolute_url)
+    else:
+        absolute_url = media_url
+    return absolute_url
+
+
 class TPLinkCameraPlayerEntity(MediaPlayerEntity):
     """Representation of a TP-Link camera as a media player for talkback."""
 
@@ -73,50 +118,38 @@ class TPLinkCameraPlayerEntity(MediaPlayerEntity):
 
     async def async_play_media(self, media_type: str, media_id: str, **kwargs: Any) -> None:
         """Play media from a URL or media_source URI."""
-        _LOGGER.info(f"Received play request. Type: {media_type}, Original ID: {media_id}")
-
-        media_url = None
-        if is_media_source_id(media_id):
-            try:
-                resolved_media = await async_resolve_media(self.hass, media_id, self.entity_id)
-                media_url = resolved_media.url
-                _LOGGER.info(f"Resolved media ID to playable URL: {media_url}")
-            except HomeAssistantError as err:
-                _LOGGER.error(f"Failed to resolve media source: {err}")
-                return
-        else:
-            media_url = media_id
-            _LOGGER.info(f"Received direct media path: {media_url}")
-
-        if not media_url:
-            _LOGGER.error("Could not determine a valid media URL.")
+        _LOGGER.info("Received play request. Type: %s, Original ID: %s", media_type, media_id)
+
+        # Open the talk channel while the media URL is being resolved.
+        self.hass.async_create_task(self._player.prewarm())
+
+        absolute_url = await async_resolve_media_url(self.hass, media_id, self.entity_id)
+        if not absolute_url:
             return
 
-        if media_url.startswith("/"):
-            base_url = get_url(self.hass)
-            absolute_url = urljoin(base_url, media_url)
-            _LOGGER.info(f"Converted relative path to absolute URL: {absolute_url}")
-        else:
-            absolute_url = media_url
+        priority = PRIORITY_ANNOUNCE if kwargs.get("announce") else PRIORITY_NORMAL
+        requested = (kwargs.get("extra") or {}).get("priority")
+        if requested is not None:
+            if requested not in PRIORITIES:
+                raise HomeAssistantError(
+                    f"Unknown priority {requested!r}; use one of {', '.join(PRIORITIES)}"
+                )
+            priority = PRIORITIES[requested]
 
         self._attr_state = STATE_PLAYING
         self.async_write_ha_state()
 
-        await self.hass.async_add_executor_job(self._play_media_blocking, absolute_url)
-
-    def _play_media_blocking(self, media_url: str) -> None:
-        """Blocking method that runs in a separate thread."""
         try:
-            self._player.play_media(media_url)
+            await self._player.play_media(absolute_url, priority)
+        except PlaybackQueueFull as e:
+            raise HomeAssistantError(str(e)) from e
         except Exception as e:
-            _LOGGER.error(f"Error playing media on camera: {e}")
+            _LOGGER.error("Error playing media on camera: %s", e)
         finally:
-            self.hass.add_job(self.async_set_idle)
-
-    async def async_set_idle(self) -> None:
-        """Set the state to idle and update Home Assistant."""
-        self._attr_state = STATE_IDLE
-        self.async_write_ha_state()
+            # Other requests may still be queued on the speaker.
+            if not self._player.busy:
+                self._attr_state = STATE_IDLE
+                self.async_write_ha_state()
 
     async def async_browse_media(self, media_content_type=None, media_content_id=None):
         """Implement the media browser."""
@@ -0,0 +1,106 @@
+"""Per-camera performance metrics for the TP-Link IPC Camera integration."""
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+_T = TypeVar("_T")
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Counts durations in fixed buckets; cheap enough to update on every call."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last: Optional[float] = None
+
+    def observe(self, seconds: float):
+        index = 0
+        while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Return the upper bound of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        bounds = [f"le_{bound}" for bound in LATENCY_BUCKETS] + ["inf"]
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "last": self.last,
+            "buckets": dict(zip(bounds, self.buckets)),
+        }
+
+
+class DeviceMetrics:
+    """Metrics shared by the API client and talkback player of one camera."""
+
+    def __init__(self):
+        self.request_latency = LatencyHistogram()
+        self.request_failures = 0
+        self.login_latency = LatencyHistogram()
+        self.handshake_latency = LatencyHistogram()
+        self.handshake_failures = 0
+        self.executor_wait = LatencyHistogram()
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.ffmpeg_runs = 0
+        self.ffmpeg_exit_codes: Counter = Counter()
+
+    def record_ffmpeg_exit(self, returncode: Optional[int]):
+        self.ffmpeg_runs += 1
+        self.ffmpeg_exit_codes[str(returncode)] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "request_latency": self.request_latency.as_dict(),
+            "request_failures": self.request_failures,
+            "login_latency": self.login_latency.as_dict(),
+            "handshake_latency": self.handshake_latency.as_dict(),
+            "handshake_failures": self.handshake_failures,
+            "executor_wait": self.executor_wait.as_dict(),
+            "packets_sent": self.packets_sent,
+            "bytes_sent": self.bytes_sent,
+            "ffmpeg_runs": self.ffmpeg_runs,
+            "ffmpeg_exit_codes": dict(self.ffmpeg_exit_codes),
+        }
+
+
+async def run_in_executor(metrics: Optional[DeviceMetrics], func: Callable[..., _T], *args) -> _T:
+    """Run a blocking call in the default executor, recording how long it queued."""
+    submitted = time.monotonic()
+
+    def _job():
+        return time.monotonic() - submitted, func(*args)
+
+    waited, result = await asyncio.get_running_loop().run_in_executor(None, _job)
+    if metrics is not None:
+        metrics.executor_wait.observe(waited)
+    return result
@@ -2,6 +2,8 @@
 from dataclasses import dataclass
 
 from .api import TPLinkIPCApiClient
+from .coordinator import TPLinkIPCDataUpdateCoordinator
+from .metrics import DeviceMetrics
 from .talkback import TPLinkTalkbackPlayer
 
 
@@ -10,4 +12,6 @@ class TPLinkCameraData:
     """A container for all client instances."""
 
     api_client: TPLinkIPCApiClient
-    talkback_client: TPLinkTalkbackPlayer
\ No newline at end of file
+    talkback_client: TPLinkTalkbackPlayer
+    coordinator: TPLinkIPCDataUpdateCoordinator
+    metrics: DeviceMetrics
@@ -0,0 +1,132 @@
+"""Shared per-camera client registry for the TP-Link IPC Camera integration."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_call_later
+
+from .api import TPLinkIPCApiClient
+from .cache import AnnouncementCache
+from .const import DATA_CLIENT_REGISTRY, DEFAULT_LEAD_IN_MS
+from .metrics import DeviceMetrics
+from .talkback import TPLinkTalkbackPlayer
+
+# How long unused clients stay open, so a reload or a config flow followed by
+# setup reuses the pooled connection, stok and talk channel.
+CLIENT_LINGER_SECONDS = 120
+
+
+@dataclass
+class CameraClients:
+    """The API client and talkback player shared for one camera login."""
+
+    api_client: TPLinkIPCApiClient
+    talkback_client: TPLinkTalkbackPlayer
+    metrics: DeviceMetrics
+    refs: int = 0
+    cancel_close: CALLBACK_TYPE | None = field(default=None, repr=False)
+
+
+class ClientRegistry:
+    """Hands out one set of clients per (host, username, password)."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the registry."""
+        self._hass = hass
+        self._clients: dict[tuple[str, str, str], CameraClients] = {}
+        # Entries are not unloaded on shutdown, so the pooled sessions and
+        # talk channels would otherwise be left open.
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._async_close_all)
+
+    async def _async_close_all(self, _event: Event) -> None:
+        """Close every camera's clients when Home Assistant stops."""
+        clients, self._clients = list(self._clients.values()), {}
+        for camera in clients:
+            if camera.cancel_close is not None:
+                camera.cancel_close()
+                camera.cancel_close = None
+            await camera.api_client.close()
+            await camera.talkback_client.close()
+
+    @callback
+    def _async_get(self, host: str, username: str, password: str) -> CameraClients:
+        key = (host, username, password)
+        if (clients := self._clients.get(key)) is None:
+            metrics = DeviceMetrics()
+            clients = CameraClients(
+                api_client=TPLinkIPCApiClient(
+                    host=host, username=username, password=password, metrics=metrics
+                ),
+                talkback_client=TPLinkTalkbackPlayer(
+                    ip=host,
+                    user=username,
+                    password=password,
+                    session=async_get_clientsession(self._hass),
+                    metrics=metrics,
+                ),
+                metrics=metrics,
+            )
+            self._clients[key] = clients
+        if clients.cancel_close is not None:
+            clients.cancel_close()
+            clients.cancel_close = None
+        return clients
+
+    @callback
+    def async_acquire(
+        self,
+        host: str,
+        username: str,
+        password: str,
+        lead_in_ms: int = DEFAULT_LEAD_IN_MS,
+        cache: AnnouncementCache | None = None,
+    ) -> CameraClients:
+        """Return the shared clients for a camera and hold a reference to them."""
+        clients = self._async_get(host, username, password)
+        clients.talkback_client.configure(lead_in_ms=lead_in_ms, cache=cache)
+        clients.refs += 1
+        return clients
+
+    @callback
+    def async_borrow(self, host: str, username: str, password: str) -> TPLinkIPCApiClient:
+        """Return the shared API client without holding it, e.g. for a config flow."""
+        clients = self._async_get(host, username, password)
+        self._async_schedule_close((host, username, password), clients)
+        return clients.api_client
+
+    @callback
+    def async_release(self, clients: CameraClients) -> None:
+        """Drop a reference; the clients close after lingering unused."""
+        clients.refs -= 1
+        for key, registered in self._clients.items():
+            if registered is clients:
+                self._async_schedule_close(key, clients)
+                return
+
+    @callback
+    def _async_schedule_close(self, key: tuple[str, str, str], clients: CameraClients) -> None:
+        if clients.refs > 0:
+            return
+        if clients.cancel_close is not None:
+            clients.cancel_close()
+
+        async def _async_close(_now) -> None:
+            clients.cancel_close = None
+            if clients.refs > 0 or self._clients.get(key) is not clients:
+                return
+            del self._clients[key]
+            await clients.api_client.close()
+            await clients.talkback_client.close()
+
+        clients.cancel_close = async_call_later(self._hass, CLIENT_LINGER_SECONDS, _async_close)
+
+
+@callback
+def async_get_registry(hass: HomeAssistant) -> ClientRegistry:
+    """Return the integration's client registry."""
+    if (registry := hass.data.get(DATA_CLIENT_REGISTRY)) is None:
+        registry = hass.data[DATA_CLIENT_REGISTRY] = ClientRegistry(hass)
+    return registry
@@ -0,0 +1,137 @@
+"""Incremental parser for the RTSP responses of the MULTITRANS handshake."""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Guard against a peer that never finishes its header block.
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+_STATUS_LINE = re.compile(r"RTSP/\d\.\d\s+(\d{3})\s*(.*)")
+_AUTH_PARAM = re.compile(r'(\w+)\s*=\s*(?:"((?:[^"\\]|\\.)*)"|([^\s,]+))')
+
+
+class RtspProtocolError(Exception):
+    """The camera sent something that is not a valid RTSP response."""
+
+
+@dataclass
+class RtspResponse:
+    """A complete RTSP response."""
+
+    status: int
+    reason: str
+    # Lower-cased header name -> every value it was sent with, in order.
+    headers: Dict[str, List[str]] = field(default_factory=dict)
+    body: bytes = b""
+
+    def header(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Return the first value of a header, matching the name case-insensitively."""
+        values = self.headers.get(name.lower())
+        return values[0] if values else default
+
+    def header_values(self, name: str) -> List[str]:
+        """Return every value of a header that may be repeated, such as WWW-Authenticate."""
+        return self.headers.get(name.lower(), [])
+
+    @property
+    def digest_challenge(self) -> Optional[Dict[str, str]]:
+        """Return the parameters of the first ``Digest`` WWW-Authenticate challenge, if any."""
+        for value in self.header_values("WWW-Authenticate"):
+            if value.split(" ", 1)[0].lower() == "digest":
+                return parse_digest_challenge(value)
+        return None
+
+    @property
+    def session(self) -> Optional[str]:
+        """Return the session id without any ``;timeout=`` parameter."""
+        value = self.header("Session")
+        return value.split(";", 1)[0].strip() if value else None
+
+    def json(self) -> Any:
+        """Decode the body as JSON."""
+        try:
+            return json.loads(self.body)
+        except ValueError as err:
+            raise RtspProtocolError(f"Invalid JSON body: {err}") from err
+
+
+def parse_digest_challenge(value: str) -> Dict[str, str]:
+    """Parse a ``WWW-Authenticate: Digest ...`` header value into its parameters."""
+    scheme, _, params = value.strip().partition(" ")
+    if scheme.lower() != "digest":
+        raise RtspProtocolError(f"Unsupported authentication scheme: {scheme}")
+    return {
+        key.lower(): quoted.replace('\\"', '"') if quoted is not None and not bare else bare
+        for key, quoted, bare in _AUTH_PARAM.findall(params)
+    }
+
+
+class RtspResponseParser:
+    """Buffers stream data and yields complete responses.
+
+    Handles responses split over several reads, several responses in one read,
+    bodies delimited by Content-Length and interleaved ``$`` binary frames,
+    which are skipped.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[RtspResponse]:
+        """Add received bytes and return every response completed by them."""
+        self._buffer += data
+        responses = []
+        while True:
+            response = self._parse_one()
+            if response is None:
+                return responses
+            responses.append(response)
+
+    def _parse_one(self) -> Optional[RtspResponse]:
+        buffer = self._buffer
+        while True:
+            if buffer[:1] == b"$":
+                if len(buffer) < 4:
+                    return None
+                length = int.from_bytes(buffer[2:4], "big")
+                if len(buffer) < 4 + length:
+                    return None
+                del buffer[:4 + length]
+            elif buffer[:2] == b"\r\n":
+                # Tolerate stray line breaks between messages.
+                del buffer[:2]
+            else:
+                break
+
+        end = buffer.find(b"\r\n\r\n")
+        if end < 0:
+            if len(buffer) > MAX_HEADER_BYTES:
+                raise RtspProtocolError("RTSP header block too large.")
+            return None
+
+        lines = buffer[:end].decode("utf-8", errors="replace").split("\r\n")
+        match = _STATUS_LINE.match(lines[0])
+        if not match:
+            raise RtspProtocolError(f"Invalid RTSP status line: {lines[0]!r}")
+        headers: Dict[str, List[str]] = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise RtspProtocolError(f"Invalid RTSP header line: {line!r}")
+            headers.setdefault(name.strip().lower(), []).append(value.strip())
+
+        try:
+            length = int(headers.get("content-length", ["0"])[0])
+        except ValueError as err:
+            raise RtspProtocolError("Invalid Content-Length header.") from err
+        if length < 0 or length > MAX_BODY_BYTES:
+            raise RtspProtocolError(f"Unacceptable Content-Length: {length}")
+        body_start = end + 4
+        if len(buffer) < body_start + length:
+            return None
+
+        body = bytes(buffer[body_start:body_start + length])
+        del buffer[:body_start + length]
+        return RtspResponse(int(match.group(1)), match.group(2).strip(), headers, body)
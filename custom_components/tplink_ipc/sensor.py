@@ -0,0 +1,142 @@
+"""Diagnostic performance sensors for the TP-Link IPC Camera integration."""
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import DOMAIN
+from .metrics import DeviceMetrics, LatencyHistogram
+from .models import TPLinkCameraData
+
+# The sensors only read in-memory counters, so refreshing them costs nothing.
+SCAN_INTERVAL = timedelta(seconds=60)
+PARALLEL_UPDATES = 0
+
+
+def _ms(value: float | None) -> float | None:
+    return round(value * 1000, 1) if value is not None else None
+
+
+def _p99_ms(histogram: LatencyHistogram) -> float | None:
+    return _ms(histogram.percentile(0.99))
+
+
+@dataclass(frozen=True, kw_only=True)
+class TPLinkIPCSensorEntityDescription(SensorEntityDescription):
+    """Describes a sensor that reads one of a camera's metrics."""
+
+    value_fn: Callable[[DeviceMetrics], float | int | None]
+
+
+SENSORS: tuple[TPLinkIPCSensorEntityDescription, ...] = (
+    TPLinkIPCSensorEntityDescription(
+        key="request_latency",
+        name="Request latency",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda metrics: _ms(metrics.request_latency.mean),
+    ),
+    TPLinkIPCSensorEntityDescription(
+        key="request_latency_p99",
+        name="Request latency p99",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda metrics: _p99_ms(metrics.request_latency),
+    ),
+    TPLinkIPCSensorEntityDescription(
+        key="request_failures",
+        name="Request failures",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda metrics: metrics.request_failures,
+    ),
+    TPLinkIPCSensorEntityDescription(
+        key="logins",
+        name="Logins",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda metrics: metrics.login_latency.count,
+    ),
+    TPLinkIPCSensorEntityDescription(
+        key="handshake_duration",
+        name="Talk handshake duration",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda metrics: _ms(metrics.handshake_latency.last),
+    ),
+    TPLinkIPCSensorEntityDescription(
+        key="packets_sent",
+        name="Audio packets sent",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda metrics: metrics.packets_sent,
+    ),
+    TPLinkIPCSensorEntityDescription(
+        key="executor_wait",
+        name="Executor wait",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda metrics: _ms(metrics.executor_wait.mean),
+    ),
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up the TP-Link IPC Camera metric sensors from a config entry."""
+    camera_data: TPLinkCameraData = hass.data[DOMAIN][config_entry.entry_id]
+
+    async_add_entities(
+        TPLinkIPCMetricSensor(camera_data.metrics, config_entry, description)
+        for description in SENSORS
+    )
+
+
+class TPLinkIPCMetricSensor(SensorEntity):
+    """A performance metric of one camera; disabled unless the user enables it."""
+
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    entity_description: TPLinkIPCSensorEntityDescription
+
+    def __init__(
+        self,
+        metrics: DeviceMetrics,
+        config_entry: ConfigEntry,
+        description: TPLinkIPCSensorEntityDescription,
+    ) -> None:
+        """Initialize the sensor."""
+        self.entity_description = description
+        self._metrics = metrics
+        self._attr_unique_id = (
+            f"{config_entry.unique_id or config_entry.entry_id}_{description.key}"
+        )
+
+        # Link to the same device as the switch
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, config_entry.unique_id or config_entry.entry_id)},
+            name=config_entry.title,
+        )
+
+    @property
+    def native_value(self) -> float | int | None:
+        """Return the current value of the metric."""
+        return self.entity_description.value_fn(self._metrics)
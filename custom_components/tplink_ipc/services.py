@@ -0,0 +1,153 @@
+"""Services for the TP-Link IPC Camera integration."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.const import Platform
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv, entity_registry as er
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.service import async_extract_entity_ids
+
+from .api import TPLinkIPCApiClient, TPIPCApiError
+from .const import DATA_AUDIO_CACHE, DOMAIN
+from .coordinator import TPIPCWriteTimeoutError
+from .media_player import async_resolve_media_url
+from .models import TPLinkCameraData
+from .talkback import broadcast
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_BROADCAST_MEDIA = "broadcast_media"
+SERVICE_SET_LENS_MASK = "set_lens_mask"
+ATTR_MEDIA_CONTENT_ID = "media_content_id"
+ATTR_ENABLED = "enabled"
+ATTR_MAX_CONCURRENCY = "max_concurrency"
+ATTR_TIMEOUT = "timeout"
+
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_TIMEOUT = 15
+
+BROADCAST_MEDIA_SCHEMA = cv.make_entity_service_schema(
+    {vol.Required(ATTR_MEDIA_CONTENT_ID): cv.string}
+)
+SET_LENS_MASK_SCHEMA = cv.make_entity_service_schema(
+    {
+        vol.Required(ATTR_ENABLED): cv.boolean,
+        vol.Optional(ATTR_MAX_CONCURRENCY, default=DEFAULT_MAX_CONCURRENCY): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=256)
+        ),
+        vol.Optional(ATTR_TIMEOUT, default=DEFAULT_TIMEOUT): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=120)
+        ),
+    }
+)
+
+
+def _camera_data_for_entities(
+    hass: HomeAssistant, entity_ids: set[str], platform: Platform
+) -> dict[str, TPLinkCameraData]:
+    """Map this integration's entities of a platform to their camera data."""
+    registry = er.async_get(hass)
+    cameras: dict[str, TPLinkCameraData] = {}
+    for entity_id in entity_ids:
+        entry = registry.async_get(entity_id)
+        if entry is None or entry.platform != DOMAIN or entry.domain != platform:
+            continue
+        camera_data = hass.data.get(DOMAIN, {}).get(entry.config_entry_id)
+        if camera_data is not None:
+            cameras[entity_id] = camera_data
+    return cameras
+
+
+async def _async_broadcast_media(call: ServiceCall) -> None:
+    """Play one announcement on several cameras from a single encode."""
+    hass = call.hass
+    entity_ids = await async_extract_entity_ids(hass, call)
+    cameras = _camera_data_for_entities(hass, entity_ids, Platform.MEDIA_PLAYER)
+    if not cameras:
+        raise HomeAssistantError("No TP-Link IPC speakers were targeted.")
+
+    media_url = await async_resolve_media_url(hass, call.data[ATTR_MEDIA_CONTENT_ID])
+    if not media_url:
+        raise HomeAssistantError("Could not determine a valid media URL.")
+
+    players = [camera_data.talkback_client for camera_data in cameras.values()]
+    await broadcast(
+        players, async_get_clientsession(hass), media_url, hass.data.get(DATA_AUDIO_CACHE)
+    )
+
+
+async def _async_set_lens_mask(call: ServiceCall) -> ServiceResponse:
+    """Set the lens mask on many cameras concurrently and report per camera."""
+    hass = call.hass
+    entity_ids = await async_extract_entity_ids(hass, call)
+    cameras = _camera_data_for_entities(hass, entity_ids, Platform.SWITCH)
+    if not cameras:
+        raise HomeAssistantError("No TP-Link IPC lens mask switches were targeted.")
+
+    payload = (
+        TPLinkIPCApiClient.PAYLOAD_SET_LENSMASK_ON
+        if call.data[ATTR_ENABLED]
+        else TPLinkIPCApiClient.PAYLOAD_SET_LENSMASK_OFF
+    )
+    semaphore = asyncio.Semaphore(call.data[ATTR_MAX_CONCURRENCY])
+    timeout = call.data[ATTR_TIMEOUT]
+
+    async def _set(camera_data: TPLinkCameraData) -> dict[str, Any]:
+        async with semaphore:
+            try:
+                await camera_data.coordinator.async_write("lens_mask", payload, timeout)
+            except TPIPCWriteTimeoutError as err:
+                # A write already sent may still be applied; the next poll shows it.
+                return {"success": False, "unconfirmed": err.sent, "error": str(err)}
+            except TPIPCApiError as err:
+                return {"success": False, "unconfirmed": False, "error": str(err)}
+        return {"success": True, "unconfirmed": False, "error": None}
+
+    outcomes = await asyncio.gather(*(_set(camera_data) for camera_data in cameras.values()))
+    results = dict(zip(cameras, outcomes))
+    failed = sorted(
+        entity_id
+        for entity_id, result in results.items()
+        if not result["success"] and not result["unconfirmed"]
+    )
+    unconfirmed = sorted(entity_id for entity_id, result in results.items() if result["unconfirmed"])
+    if failed:
+        _LOGGER.warning("Failed to set lens mask on %s", ", ".join(failed))
+    if unconfirmed:
+        _LOGGER.warning("Lens mask change on %s was sent but not confirmed in time",
+                        ", ".join(unconfirmed))
+    return {
+        "succeeded": len(results) - len(failed) - len(unconfirmed),
+        "failed": len(failed),
+        "unconfirmed": len(unconfirmed),
+        "results": results,
+    }
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the integration's services."""
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_BROADCAST_MEDIA,
+        _async_broadcast_media,
+        schema=BROADCAST_MEDIA_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_LENS_MASK,
+        _async_set_lens_mask,
+        schema=SET_LENS_MASK_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
@@ -3,13 +3,17 @@ from typing import Any
 
 from homeassistant.components.switch import SwitchEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import STATE_OFF, STATE_ON
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.exceptions import HomeAssistantError
 
 from .api import TPLinkIPCApiClient, TPIPCApiError
 from .const import DOMAIN
+from .coordinator import TPLinkIPCDataUpdateCoordinator
 from .models import TPLinkCameraData
 
 _LOGGER = logging.getLogger(__name__)
@@ -22,24 +26,33 @@ async def async_setup_entry(
 ) -> None:
     """Set up the TP-Link IPC Camera switches from a config entry."""
     camera_data: TPLinkCameraData = hass.data[DOMAIN][config_entry.entry_id]
-    
-    lens_mask_switch = LensMaskSwitch(camera_data.api_client, config_entry)
-    async_add_entities([lens_mask_switch], update_before_add=True)
 
+    lens_mask_switch = LensMaskSwitch(camera_data.coordinator, config_entry)
+    async_add_entities([lens_mask_switch])
 
-class LensMaskSwitch(SwitchEntity):
+
+class LensMaskSwitch(
+    CoordinatorEntity[TPLinkIPCDataUpdateCoordinator], SwitchEntity, RestoreEntity
+):
     """Representation of a lens mask switch for a TP-Link camera."""
 
     _attr_has_entity_name = True
 
-    def __init__(self, client: TPLinkIPCApiClient, config_entry: ConfigEntry) -> None:
+    def __init__(
+        self, coordinator: TPLinkIPCDataUpdateCoordinator, config_entry: ConfigEntry
+    ) -> None:
         """Initialize the switch."""
-        self._client = client
-        self._attr_is_on = None
+        super().__init__(coordinator)
+        self._client: TPLinkIPCApiClient = coordinator.client
         self._attr_name = "Lens Mask"
         self._attr_unique_id = f"{config_entry.unique_id or config_entry.entry_id}_lens_mask"
         self._attr_icon = "mdi:cctv-off"
-        
+        # Shown until the camera confirms a write, or rolled back if it fails.
+        self._optimistic_state: bool | None = None
+        self._writes_in_flight = 0
+        # Last known state from before a restart, shown until the first poll.
+        self._restored_state: bool | None = None
+
         # Link to the device
         self._attr_device_info = DeviceInfo(
             identifiers={(DOMAIN, config_entry.unique_id or config_entry.entry_id)},
@@ -47,26 +60,62 @@ class LensMaskSwitch(SwitchEntity):
             # You can add more device info here if the API provides it, e.g., model, fw_version
         )
 
-    async def _execute_api_call(self, api_call, *args):
-        """Execute a blocking API call in the executor."""
+        # Registered here rather than in async_added_to_hass so the read is part
+        # of the first batched poll that runs right after platform setup.
+        self._unregister_read = coordinator.register_read("lens_mask", "lens_mask_info")
+
+    async def async_added_to_hass(self) -> None:
+        """Run when the entity is added to Home Assistant."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._unregister_read)
+        last_state = await self.async_get_last_state()
+        if last_state is not None and last_state.state in (STATE_ON, STATE_OFF):
+            self._restored_state = last_state.state == STATE_ON
+
+    @property
+    def is_on(self) -> bool | None:
+        """Return whether the lens mask is enabled."""
+        if self._optimistic_state is not None:
+            return self._optimistic_state
+        if not self.coordinator.data:
+            return self._restored_state
+        try:
+            return self._client.parse_lens_mask_status(self.coordinator.data)
+        except TPIPCApiError:
+            return None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Drop the optimistic state once a read after the last write arrives."""
+        if not self._writes_in_flight:
+            self._optimistic_state = None
+        super()._handle_coordinator_update()
+
+    async def _async_set_lens_mask(self, enabled: bool) -> None:
+        """Show the new state immediately and queue the write."""
+        payload = (
+            self._client.PAYLOAD_SET_LENSMASK_ON
+            if enabled
+            else self._client.PAYLOAD_SET_LENSMASK_OFF
+        )
+        self._optimistic_state = enabled
+        self._writes_in_flight += 1
+        self.async_write_ha_state()
         try:
-            return await self.hass.async_add_executor_job(api_call, *args)
+            await self.coordinator.async_write("lens_mask", payload)
         except TPIPCApiError as err:
             _LOGGER.error("API call failed: %s", err)
+            if self._writes_in_flight == 1:
+                self._optimistic_state = None
             raise HomeAssistantError(f"Failed to communicate with camera: {err}") from err
+        finally:
+            self._writes_in_flight -= 1
+            self.async_write_ha_state()
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn the lens mask on (enable privacy mode)."""
-        await self._execute_api_call(self._client.set_lens_mask_on)
-        self._attr_is_on = True
-        self.async_write_ha_state()
+        await self._async_set_lens_mask(True)
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn the lens mask off (disable privacy mode)."""
-        await self._execute_api_call(self._client.set_lens_mask_off)
-        self._attr_is_on = False
-        self.async_write_ha_state()
-
-    async def async_update(self) -> None:
-        """Fetch the latest state of the lens mask."""
-        self._attr_is_on = await self._execute_api_call(self._client.get_lens_mask_status)
\ No newline at end of file
+        await self._async_set_lens_mask(False)
@@ -1,70 +1,1023 @@
-import socket
+import asyncio
+import contextlib
 import json
 import hashlib
-import subprocess
 import struct
 import logging
+import time
 import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .audio import (
+    SAMPLE_RATE,
+    SAMPLES_PER_PACKET,
+    RtpPacketizer,
+    UnsupportedAudioError,
+    alaw_silence,
+    can_decode,
+    to_alaw,
+)
+from .cache import AnnouncementCache, response_validator
+from .const import DEFAULT_LEAD_IN_MS
+from .metrics import DeviceMetrics, run_in_executor
+from .rtsp import RtspResponseParser
 
 _LOGGER = logging.getLogger(__name__)
 
+RTSP_PORT = 554
+# How long an authenticated talk channel is kept open for reuse after playback;
+# it is closed once idle this long, freeing the camera's only talk channel.
+SESSION_IDLE_TIMEOUT = 60
+CONNECT_TIMEOUT = 10
+# A pre-warm handshake that failed this recently stands in for the handshake
+# of the playback that follows, instead of the camera being tried twice.
+PREWARM_FAILURE_TTL = 5
+FETCH_TIMEOUT = 10
+TRANSCODE_TIMEOUT = 60
+PACKET_INTERVAL = 0.02
+# Packets are sent up to this long before they are due, so that a busy event
+# loop waking up a little late does not leave the camera without audio.
+PACING_LEAD = 0.04
+# Falling further behind than this restarts the schedule instead of bursting
+# the backlog at the camera.
+PACING_RESYNC = 0.5
+# Frames waiting to be written to the camera; about one second of audio. A
+# full queue makes the producer wait instead of buffering without bound.
+SEND_QUEUE_SIZE = 50
+# A camera that takes this long to accept a write, or to take a flushed queue,
+# has stopped reading; the channel is given up instead of waiting forever.
+SEND_TIMEOUT = 10
+PREFETCH_CHUNK_SIZE = 16 * 1024
+# Bounded buffer between the HTTP fetch and ffmpeg, in chunks (about 1 MB).
+PREFETCH_CHUNKS = 64
+# Source bytes buffered before ffmpeg is started, unless the clip ends sooner.
+PREFETCH_START_BYTES = 64 * 1024
+# A-law read from ffmpeg per pipe read: 200 ms of audio.
+FFMPEG_READ_SIZE = 8 * SAMPLES_PER_PACKET
+# Longer clips are streamed but not kept in the announcement cache (~4 minutes).
+CACHEABLE_CLIP_BYTES = 2 * 1024 * 1024
+# Clips waiting for the speaker, not counting the one playing.
+PLAYBACK_QUEUE_SIZE = 8
+# How long a broadcast waits for a camera's talk channel to be free; a camera
+# still busy after that is left out so the others start together.
+BROADCAST_JOIN_TIMEOUT = 1
+
+# Playback priorities; a clip interrupts the one playing if its priority is higher.
+PRIORITY_NORMAL = 0
+PRIORITY_ANNOUNCE = 1
+PRIORITY_ALARM = 2
+
+
+class PlaybackQueueFull(Exception):
+    """The speaker's queue is full of clips at least as important as the new one."""
+
+
+@dataclass
+class PlaybackTimings:
+    """Start-up timings of one playback, in seconds from the play request."""
+
+    reused_channel: bool = False
+    cache_hit: bool = False
+    in_process: bool = False
+    handshake: float = 0.0
+    ffmpeg_spawn: float = 0.0
+    first_packet: Optional[float] = None
+    lead_in_ms: int = 0
+    # Prefetch of the source, which runs while the handshake is in progress.
+    fetch_first_byte: Optional[float] = None
+    fetch_buffered: Optional[float] = None
+    fetch_done: Optional[float] = None
+
+
+@dataclass
+class PacingStats:
+    """How closely one playback kept to its RTP schedule."""
+
+    packets: int = 0
+    bytes: int = 0
+    # Packets that were sent after they were due.
+    late_packets: int = 0
+    resyncs: int = 0
+    # RFC 3550 style smoothed variation of the send delay, in seconds.
+    jitter: float = 0.0
+    max_late: float = 0.0
+    duration: float = 0.0
+
+    def as_dict(self) -> dict:
+        result = vars(self).copy()
+        result["packets_per_second"] = self.packets / self.duration if self.duration else None
+        result["bytes_per_second"] = self.bytes / self.duration if self.duration else None
+        return result
+
+
+@dataclass
+class _QueuedClip:
+    """A clip waiting for the speaker, shared by every caller that asked for it."""
+
+    media_url: str
+    priority: int
+    done: asyncio.Future = field(repr=False)
+
+
+class _TalkChannel:
+    """An authenticated MULTITRANS connection with a bounded send queue."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.error: Optional[BaseException] = None
+        self._sender = asyncio.ensure_future(self._send_loop())
+        self._watcher = asyncio.ensure_future(self._watch())
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.error is None
+            and not self._writer.is_closing()
+            and not self._sender.done()
+            and not self._watcher.done()
+        )
+
+    async def send(self, frame: bytes):
+        """Queue a frame, waiting while the camera is not keeping up."""
+        if not self.alive:
+            raise ConnectionError(f"Talk channel closed: {self.error}")
+        await self._queue.put(frame)
+
+    def send_nowait(self, frame: bytes):
+        """Queue a frame, failing instead of waiting if the camera is not keeping up."""
+        if not self.alive:
+            raise ConnectionError(f"Talk channel closed: {self.error}")
+        if self._queue.full():
+            raise ConnectionError("Camera is not keeping up with the audio stream.")
+        self._queue.put_nowait(frame)
+
+    async def flush(self):
+        """Wait until every queued frame has been handed to the socket."""
+        join = asyncio.ensure_future(self._queue.join())
+        try:
+            done, _ = await asyncio.wait(
+                {join, self._sender}, timeout=SEND_TIMEOUT, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            join.cancel()
+        if not done and self.error is None:
+            self.error = TimeoutError(f"Camera took no audio for {SEND_TIMEOUT} s.")
+        if self.error is not None:
+            raise ConnectionError(f"Talk channel closed: {self.error}")
+
+    def discard(self):
+        """Drop frames not yet written, e.g. the rest of an interrupted clip."""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+
+    async def _send_loop(self):
+        try:
+            while True:
+                # Everything queued while the last write drained goes out as
+                # one write; the camera splits interleaved frames itself.
+                frames = [await self._queue.get()]
+                while not self._queue.empty():
+                    frames.append(self._queue.get_nowait())
+                self._writer.write(b''.join(frames))
+                try:
+                    await asyncio.wait_for(self._writer.drain(), SEND_TIMEOUT)
+                except asyncio.TimeoutError as e:
+                    raise TimeoutError(f"Camera took no audio for {SEND_TIMEOUT} s.") from e
+                for _ in frames:
+                    self._queue.task_done()
+        except (OSError, ConnectionError) as e:
+            self.error = e
+            # Wake producers waiting on the full queue; their next send fails.
+            self.discard()
+
+    async def _watch(self):
+        """Discard unsolicited camera messages; returning means the camera hung up."""
+        try:
+            while await self._reader.read(4096):
+                pass
+        except (OSError, ConnectionError) as e:
+            self.error = e
+        if self.error is None:
+            self.error = ConnectionResetError("Camera closed the talk channel.")
+
+    async def close(self):
+        for task in (self._sender, self._watcher):
+            task.cancel()
+        if self.error is not None:
+            # Audio left in the socket buffer would never drain; don't wait for it.
+            self._writer.transport.abort()
+        self._writer.close()
+        with contextlib.suppress(OSError, ConnectionError):
+            await self._writer.wait_closed()
+
+
+def _interleave(rtp_packet: bytes) -> bytes:
+    """Wrap an RTP packet in an RTSP interleaved frame on channel 1."""
+    return b'$' + struct.pack('!BH', 1, len(rtp_packet)) + rtp_packet
+
+
+def _find_error_code(value):
+    """Return the first "error_code" found anywhere in a decoded JSON reply."""
+    if isinstance(value, dict):
+        if "error_code" in value:
+            return value["error_code"]
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            found = _find_error_code(item)
+            if found is not None:
+                return found
+    return None
+
+
+class _RtpPacer:
+    """Sends RTP packets when their timestamp falls due on the loop's monotonic clock.
+
+    The schedule starts at the first packet, so the source may deliver packets
+    early and in bursts, as ffmpeg running ahead on its pipe does; packets that fall due
+    together are queued together and leave the channel in one write.
+    """
+
+    def __init__(self, send, stats: PacingStats):
+        self._send = send
+        self._stats = stats
+        self._loop = asyncio.get_running_loop()
+        self._start: Optional[float] = None
+        self._base_timestamp = 0
+        self._last_delay: Optional[float] = None
+
+    async def send(self, rtp_packet: bytes):
+        timestamp = struct.unpack_from('!I', rtp_packet, 4)[0]
+        now = self._loop.time()
+        if self._start is None:
+            self._start = now
+            self._base_timestamp = timestamp
+        due = self._start + ((timestamp - self._base_timestamp) & 0xFFFFFFFF) / SAMPLE_RATE
+        if due - now > PACING_LEAD:
+            await asyncio.sleep(due - now - PACING_LEAD)
+            now = self._loop.time()
+        late = now - due
+        stats = self._stats
+        if late > PACING_RESYNC:
+            _LOGGER.debug("RTP pacing fell %.3fs behind; resynchronising.", late)
+            self._start += late
+            stats.resyncs += 1
+            late = 0.0
+        if late > 0:
+            stats.late_packets += 1
+            stats.max_late = max(stats.max_late, late)
+        # Jitter is measured against the scheduled send time, i.e. with the lead.
+        delay = max(late + PACING_LEAD, 0.0)
+        if self._last_delay is not None:
+            stats.jitter += (abs(delay - self._last_delay) - stats.jitter) / 16
+        self._last_delay = delay
+        await self._send(rtp_packet)
+        stats.packets += 1
+        stats.bytes += len(rtp_packet)
+        stats.duration = self._loop.time() - self._start
+
+
+async def encode_clip(data: bytes, metrics: Optional[DeviceMetrics] = None) -> Optional[bytes]:
+    """Encode a fetched WAV or MP3 file in-process; None means ffmpeg is needed."""
+    if not can_decode(data):
+        return None
+    try:
+        # Encoding is a short CPU burst; keep it off the event loop.
+        return await run_in_executor(metrics, to_alaw, data)
+    except UnsupportedAudioError as e:
+        _LOGGER.debug("In-process decode failed, using ffmpeg: %s", e)
+        return None
+
+
+async def decode_url(session: aiohttp.ClientSession, media_url) -> Optional[bytes]:
+    """Fetch a WAV or MP3 source and encode it in-process; None means ffmpeg is needed.
+
+    The format is told from the first bytes, so a source ffmpeg has to
+    decode is not downloaded in full first.
+    """
+    if urlparse(media_url).scheme not in ('http', 'https'):
+        return None
+    try:
+        async with session.get(
+            media_url, timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+        ) as response:
+            response.raise_for_status()
+            data = await response.content.readany()
+            if not can_decode(data):
+                return None
+            data += await response.content.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        _LOGGER.debug("Fetching %s failed, using ffmpeg: %s", media_url, e)
+        return None
+    return await encode_clip(data)
+
+
+class _MediaPrefetch:
+    """Streams a clip over HTTP into a bounded buffer, e.g. during the handshake.
+
+    The fetch waits while the buffer is full, so a long clip is never held in
+    memory as a whole unless the consumer asks for it with read_all.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, media_url, timings: PlaybackTimings,
+                 started: float):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=PREFETCH_CHUNKS)
+        self._timings = timings
+        self._started = started
+        self._progress = asyncio.Event()
+        self.received = 0
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.content_type: Optional[str] = None
+        self.content_length: Optional[int] = None
+        # Identifies this version of the source for the announcement cache.
+        self.validator: Optional[str] = None
+        self.responded = False
+        self.head = b''
+        self._task = asyncio.ensure_future(self._fetch(session, media_url))
+
+    async def _fetch(self, session, media_url):
+        try:
+            async with session.get(
+                media_url,
+                timeout=aiohttp.ClientTimeout(sock_connect=FETCH_TIMEOUT, sock_read=FETCH_TIMEOUT),
+            ) as response:
+                response.raise_for_status()
+                self.content_type = response.content_type
+                self.content_length = response.content_length
+                self.validator = response_validator(response.headers)
+                self.responded = True
+                self._progress.set()
+                async for chunk in response.content.iter_chunked(PREFETCH_CHUNK_SIZE):
+                    if self._timings.fetch_first_byte is None:
+                        self._timings.fetch_first_byte = time.monotonic() - self._started
+                        self.head = chunk[:16]
+                    self.received += len(chunk)
+                    self._progress.set()
+                    await self._queue.put(chunk)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.error = e
+        self.finished = True
+        self._timings.fetch_done = time.monotonic() - self._started
+        self._progress.set()
+        await self._queue.put(None)
+
+    @property
+    def complete(self) -> bool:
+        """Whether the whole clip arrived, as far as the server declared its length."""
+        return (
+            self.finished and self.error is None
+            and (self.content_length is None or self.received >= self.content_length)
+        )
+
+    async def wait_headers(self):
+        """Wait until the response headers have arrived or the fetch has ended."""
+        while not self.responded and not self.finished:
+            self._progress.clear()
+            await self._progress.wait()
+
+    async def wait_buffered(self, size):
+        """Wait until size bytes have arrived or the fetch has ended."""
+        while self.received < size and not self.finished:
+            self._progress.clear()
+            await self._progress.wait()
+        self._timings.fetch_buffered = time.monotonic() - self._started
+
+    async def chunks(self):
+        """Yield buffered chunks until the end of the clip."""
+        while (chunk := await self._queue.get()) is not None:
+            yield chunk
+
+    async def read_all(self) -> bytes:
+        data = b''.join([chunk async for chunk in self.chunks()])
+        self._timings.fetch_buffered = self._timings.fetch_done
+        return data
+
+    def close(self):
+        self._task.cancel()
+
+
+async def _feed_stdin(process, chunks):
+    """Write the buffered source to ffmpeg, closing stdin at the end of the clip."""
+    try:
+        async for chunk in chunks:
+            process.stdin.write(chunk)
+            await process.stdin.drain()
+    except (BrokenPipeError, ConnectionError) as e:
+        # ffmpeg exited early; its exit status tells why.
+        _LOGGER.debug("FFmpeg stopped reading its input: %s", e)
+    finally:
+        if not process.stdin.is_closing():
+            process.stdin.close()
+
+
+# Containers that keep their index at the end of the file, so ffmpeg has to
+# seek and cannot read them from a pipe.
+_SEEKABLE_ONLY_TYPES = {
+    'audio/3gpp', 'audio/m4a', 'audio/mp4', 'audio/x-m4a', 'video/3gpp', 'video/mp4',
+    'video/quicktime',
+}
+_ISO_BMFF_BOXES = {b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide'}
+
+
+def _can_pipe(head: bytes, content_type: Optional[str]) -> bool:
+    """Whether ffmpeg can decode a source that starts with head from a pipe."""
+    if content_type in _SEEKABLE_ONLY_TYPES:
+        return False
+    return head[4:8] not in _ISO_BMFF_BOXES
+
+
+async def _replay(data: bytes):
+    yield data
+
+
+async def transcode_to_alaw(media_url) -> bytes:
+    """Transcode a whole clip to 8 kHz mono A-law with ffmpeg, as fast as it can run."""
+    process = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-i', media_url, '-acodec', 'pcm_alaw', '-ar', '8000', '-ac', '1',
+        '-f', 'alaw', 'pipe:1',
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), TRANSCODE_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        raise RuntimeError(f"FFmpeg error: {stderr.decode(errors='replace')}")
+    return stdout
+
+
+async def fetch_validator(session: aiohttp.ClientSession, media_url) -> Optional[str]:
+    """Read only the response headers of a source to revalidate a cached clip."""
+    if urlparse(media_url).scheme not in ('http', 'https'):
+        return None
+    try:
+        async with session.get(
+            media_url, timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+        ) as response:
+            response.raise_for_status()
+            return response_validator(response.headers)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        _LOGGER.debug("Revalidating %s failed: %s", media_url, e)
+        return None
+
+
+# Without a validator a clip could go stale unnoticed, so it is not cached.
+async def _cache_get(cache: Optional[AnnouncementCache], media_url, validator: Optional[str],
+                     metrics: Optional[DeviceMetrics] = None) -> Optional[bytes]:
+    if cache is None or validator is None:
+        return None
+    return await run_in_executor(metrics, cache.get, media_url, validator)
+
+
+async def _cache_put(cache: Optional[AnnouncementCache], media_url, alaw: bytes,
+                     validator: Optional[str], metrics: Optional[DeviceMetrics] = None):
+    if cache is not None and validator is not None:
+        await run_in_executor(metrics, cache.put, media_url, alaw, validator)
+
+
+async def load_announcement(
+    session: aiohttp.ClientSession, media_url, cache: Optional[AnnouncementCache] = None
+) -> bytes:
+    """Return a whole clip as A-law, from the cache, in-process decoding or ffmpeg."""
+    validator = await fetch_validator(session, media_url) if cache is not None else None
+    alaw = await _cache_get(cache, media_url, validator)
+    if alaw is None:
+        alaw = await decode_url(session, media_url)
+        if alaw is None:
+            alaw = await transcode_to_alaw(media_url)
+        await _cache_put(cache, media_url, alaw, validator)
+    return alaw
+
+
+async def broadcast(players, session: aiohttp.ClientSession, media_url,
+                    cache: Optional[AnnouncementCache] = None):
+    """Play one clip on many cameras at once.
+
+    The clip is encoded once while every camera's talk channel is opened
+    concurrently; a single task then sends each 20 ms packet to all cameras,
+    so the speakers start together and the cost of adding a camera is one
+    queued frame per packet. Cameras busy with their own playback are left
+    out rather than delaying the others.
+    """
+    if not players:
+        return
+    active = []
+
+    async def join(player):
+        if await player._begin_broadcast():
+            active.append(player)
+
+    clip = asyncio.ensure_future(load_announcement(session, media_url, cache))
+    try:
+        # Players are released in the finally below, including those that
+        # joined before a cancellation interrupted the others.
+        await asyncio.gather(*(join(player) for player in players))
+        alaw = await clip
+        _LOGGER.info("Broadcasting %s to %d of %d cameras.", media_url, len(active), len(players))
+        streams = [
+            (player, player._packetizer.packetize(alaw_silence(player._lead_in_ms) + alaw))
+            for player in active
+        ]
+        longest = max((len(packets) for _, packets in streams), default=0)
+        dropped = []
+        loop = asyncio.get_running_loop()
+        clock = loop.time()
+        for index in range(longest):
+            delay = clock + index * PACKET_INTERVAL - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -PACING_RESYNC:
+                # The loop stalled; carry on from now rather than bursting the backlog.
+                clock -= delay
+            for player, packets in list(streams):
+                if index >= len(packets):
+                    continue
+                # No inline reconnect: a full handshake here would silence
+                # every other camera. A camera that fails is dropped.
+                try:
+                    player._send_rtp_nowait(packets[index])
+                except (OSError, ConnectionError) as e:
+                    _LOGGER.error("Dropping %s from broadcast: %s", player._ip, e)
+                    streams.remove((player, packets))
+                    dropped.append(player)
+        for player in dropped:
+            await player._close_channel()
+        for player, _ in streams:
+            with contextlib.suppress(OSError, ConnectionError):
+                await player._channel.flush()
+    finally:
+        clip.cancel()
+        for player in active:
+            player._end_broadcast()
+
+
 class TPLinkTalkbackPlayer:
     """Core class to handle communication and playback to a TP-Link camera."""
 
-    def __init__(self, ip, user, password):
+    def __init__(self, ip, user, password, session: aiohttp.ClientSession,
+                 lead_in_ms=DEFAULT_LEAD_IN_MS, inprocess_audio=True,
+                 cache: Optional[AnnouncementCache] = None,
+                 metrics: Optional[DeviceMetrics] = None, rtsp_port=RTSP_PORT):
         self._ip = ip
+        self._rtsp_port = rtsp_port
         self._user = user
         self._password = password
-        self._client_uuid = str(uuid.uuid4()) 
+        self._session = session
+        self._client_uuid = str(uuid.uuid4())
+        # Digest challenge from the last successful handshake, reused on reconnect.
+        self._challenge = None
+        # The camera has a single half-duplex talk channel, so one connection
+        # is shared by every playback and guarded by this lock.
+        self._lock = asyncio.Lock()
+        self._channel: Optional[_TalkChannel] = None
+        self._last_used = 0.0
+        self._idle_timer: Optional[asyncio.TimerHandle] = None
+        self._idle_closer: Optional[asyncio.Task] = None
+        # (monotonic time, error) of a failed pre-warm not yet reported to a playback.
+        self._prewarm_failure: Optional[Tuple[float, ConnectionError]] = None
+        self._lead_in_ms = lead_in_ms
+        self._inprocess_audio = inprocess_audio
+        self._packetizer = RtpPacketizer()
+        self._cache = cache
+        self.last_timings: Optional[PlaybackTimings] = None
+        self.last_pacing: Optional[PacingStats] = None
+        self.metrics = metrics or DeviceMetrics()
+        # Clips waiting to play, in arrival order; see play_media.
+        self._queue: List[_QueuedClip] = []
+        self._current: Optional[_QueuedClip] = None
+        self._current_task: Optional[asyncio.Task] = None
+        self._runner: Optional[asyncio.Task] = None
 
-    def play_media(self, media_url):
-        """Connects, plays an audio file from a URL, and disconnects."""
-        camera_sock = None
-        udp_sock = None
-        process = None
-        
+    def configure(self, lead_in_ms=DEFAULT_LEAD_IN_MS, cache: Optional[AnnouncementCache] = None):
+        """Apply per-entry settings to a player that may be shared across reloads."""
+        self._lead_in_ms = lead_in_ms
+        self._cache = cache
+
+    async def prewarm(self):
+        """Open the talk channel ahead of playback so the handshake is off the critical path."""
+        if self._lock.locked():
+            # Playing already, so the channel is open or being opened.
+            return
+        async with self._lock:
+            try:
+                await self._acquire_channel()
+            except ConnectionError as e:
+                _LOGGER.debug("Talk channel pre-warm failed: %s", e)
+                self._prewarm_failure = (time.monotonic(), e)
+
+    @property
+    def busy(self) -> bool:
+        """Whether a clip is playing or waiting to play."""
+        return self._current is not None or bool(self._queue)
+
+    async def close(self):
+        """Drop queued clips, stop playback and close the cached talk channel."""
+        for clip in self._queue:
+            if not clip.done.done():
+                clip.done.set_result(False)
+        self._queue.clear()
+        if self._idle_closer is not None:
+            self._idle_closer.cancel()
+        if self._runner is not None:
+            self._runner.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._runner
+        async with self._lock:
+            await self._close_channel()
+
+    async def _close_channel(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        if self._channel:
+            await self._channel.close()
+            self._channel = None
+
+    def _touch(self):
+        """Mark the talk channel as just used and restart its idle timer."""
+        self._last_used = time.monotonic()
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        if self._channel is not None:
+            self._idle_timer = asyncio.get_running_loop().call_later(
+                SESSION_IDLE_TIMEOUT, self._on_idle_timeout
+            )
+
+    def _on_idle_timeout(self):
+        self._idle_timer = None
+        if self._lock.locked():
+            # In use; whoever holds the lock restarts the timer when done.
+            return
+        self._idle_closer = asyncio.ensure_future(self._close_idle_channel())
+
+    async def _close_idle_channel(self):
+        async with self._lock:
+            idle = time.monotonic() - self._last_used
+            if self._channel is not None and idle >= SESSION_IDLE_TIMEOUT:
+                _LOGGER.debug("Closing talk channel to %s after %.1fs idle.", self._ip, idle)
+                await self._close_channel()
+
+    async def _acquire_channel(self) -> _TalkChannel:
+        """Return an open talk channel, reconnecting when the cached one is stale."""
+        if self._channel is not None:
+            idle = time.monotonic() - self._last_used
+            if idle < SESSION_IDLE_TIMEOUT and self._channel.alive:
+                self._touch()
+                return self._channel
+            _LOGGER.debug("Cached talk channel is stale (idle %.1fs); reconnecting.", idle)
+            await self._close_channel()
+        failure, self._prewarm_failure = self._prewarm_failure, None
+        if failure is not None and time.monotonic() - failure[0] < PREWARM_FAILURE_TTL:
+            raise ConnectionError(f"Talk channel pre-warm just failed: {failure[1]}")
+        started = time.monotonic()
+        streams = await self._connect_and_auth()
+        if not streams:
+            self.metrics.handshake_failures += 1
+            raise ConnectionError("Failed to authenticate with camera.")
+        self.metrics.handshake_latency.observe(time.monotonic() - started)
+        self._channel = _TalkChannel(*streams)
+        self._touch()
+        return self._channel
+
+    async def _send_frame(self, frame):
+        """Queue an interleaved frame, reconnecting once if the camera dropped the channel."""
         try:
-            _LOGGER.info("Starting playback session...")
-            camera_sock = self._connect_and_auth()
-            if not camera_sock:
-                raise ConnectionError("Failed to authenticate with camera.")
+            await self._channel.send(frame)
+        except (OSError, ConnectionError) as e:
+            _LOGGER.warning("Talk channel lost during playback (%s); reconnecting.", e)
+            await self._close_channel()
+            await (await self._acquire_channel()).send(frame)
 
-            udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            udp_sock.bind(('127.0.0.1', 0))
-            local_port = udp_sock.getsockname()[1]
-            ffmpeg_target_url = f'rtp://127.0.0.1:{local_port}'
+    async def _send_rtp(self, rtp_packet):
+        await self._send_frame(_interleave(rtp_packet))
+        self.metrics.packets_sent += 1
+        self.metrics.bytes_sent += len(rtp_packet)
 
-            command = [
-                'ffmpeg', '-re', '-i', media_url, '-af', 'adelay=2500|2500', '-acodec', 'pcm_alaw',
-                '-ar', '8000', '-ac', '1', '-f', 'rtp', ffmpeg_target_url
-            ]
-            
-            _LOGGER.info(f"Starting FFmpeg to play: {media_url}")
-            process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    def _send_rtp_nowait(self, rtp_packet):
+        """Queue a packet on the open channel without waiting or reconnecting."""
+        self._channel.send_nowait(_interleave(rtp_packet))
+        self.metrics.packets_sent += 1
+        self.metrics.bytes_sent += len(rtp_packet)
+
+    def _start_prefetch(self, media_url, timings, started) -> Optional[_MediaPrefetch]:
+        """Start fetching an HTTP source; other sources are left to ffmpeg."""
+        if urlparse(media_url).scheme not in ('http', 'https'):
+            return None
+        return _MediaPrefetch(self._session, media_url, timings, started)
 
-            while process.poll() is None:
-                udp_sock.settimeout(2.0)
+    async def _stream_packets(self, packets: List[bytes], timings, started, pacer: _RtpPacer):
+        """Send pre-built RTP packets to the camera at real-time pace."""
+        for rtp_packet in packets:
+            await pacer.send(rtp_packet)
+            if timings.first_packet is None:
+                timings.first_packet = time.monotonic() - started
+                _LOGGER.debug("Talkback start-up on %s: %s", self._ip, timings)
+
+    async def _begin_broadcast(self) -> bool:
+        """Take the talk channel for a broadcast; release with _end_broadcast."""
+        if self.busy:
+            _LOGGER.warning("Camera %s is playing; leaving it out of the broadcast.", self._ip)
+            return False
+        try:
+            await asyncio.wait_for(self._lock.acquire(), BROADCAST_JOIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            _LOGGER.warning("Camera %s is busy; leaving it out of the broadcast.", self._ip)
+            return False
+        try:
+            await self._acquire_channel()
+        except Exception as e:
+            _LOGGER.error("Camera %s cannot join broadcast: %s", self._ip, e)
+            self._lock.release()
+            return False
+        except BaseException:
+            self._lock.release()
+            raise
+        return True
+
+    def _end_broadcast(self):
+        self._touch()
+        self._lock.release()
+
+    async def play_media(self, media_url, priority=PRIORITY_NORMAL) -> bool:
+        """Queue a clip for the speaker and wait until it has played.
+
+        Clips play one after another on the same talk channel, highest priority
+        first and in arrival order within a priority. A clip with a higher
+        priority than the one playing interrupts it. Asking for a clip that is
+        already waiting joins that request instead of queueing it twice.
+        Returns False if the clip failed to play, was interrupted or was
+        dropped, and raises PlaybackQueueFull when nothing less important can make room for it.
+        """
+        clip = next((queued for queued in self._queue if queued.media_url == media_url), None)
+        if clip is not None:
+            clip.priority = max(clip.priority, priority)
+        else:
+            if len(self._queue) >= PLAYBACK_QUEUE_SIZE:
+                lowest = min(self._queue, key=lambda queued: queued.priority)
+                if lowest.priority >= priority:
+                    raise PlaybackQueueFull(f"Playback queue for {self._ip} is full.")
+                # Drop the newest of the least important clips.
+                lowest = [queued for queued in self._queue if queued.priority == lowest.priority][-1]
+                self._queue.remove(lowest)
+                lowest.done.set_result(False)
+                _LOGGER.warning("Playback queue for %s is full; dropped %s.", self._ip, lowest.media_url)
+            clip = _QueuedClip(media_url, priority, asyncio.get_running_loop().create_future())
+            self._queue.append(clip)
+
+        current = self._current
+        task = self._current_task
+        # A clip that is already being interrupted is left to finish its cleanup.
+        if (current is not None and clip.priority > current.priority
+                and task is not None and not task.cancelling()):
+            _LOGGER.info("Interrupting %s on %s for %s.", current.media_url, self._ip, media_url)
+            self._current_task.cancel()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.ensure_future(self._run_queue())
+        # Several callers may wait on the same clip; one leaving must not cancel it.
+        return await asyncio.shield(clip.done)
+
+    def _next_clip(self) -> _QueuedClip:
+        best = max(self._queue, key=lambda queued: queued.priority)
+        self._queue.remove(best)
+        return best
+
+    async def _run_queue(self):
+        """Play queued clips back to back while holding the talk channel."""
+        async with self._lock:
+            handoff = False
+            while self._queue:
+                clip = self._current = self._next_clip()
+                # Follow-on clips skip the lead-in: the speaker is already awake.
+                self._current_task = asyncio.ensure_future(
+                    self._play_media_locked(clip.media_url, 0 if handoff else None)
+                )
                 try:
-                    rtp_packet, _ = udp_sock.recvfrom(2048)
-                    if rtp_packet:
-                        interleaved_header = b'$' + struct.pack('!BH', 1, len(rtp_packet))
-                        camera_sock.sendall(interleaved_header + rtp_packet)
-                except socket.timeout:
-                    if process.poll() is not None: break
-            
+                    await asyncio.wait({self._current_task})
+                except asyncio.CancelledError:
+                    self._current_task.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await self._current_task
+                    raise
+                finally:
+                    task = self._current_task
+                    played = (
+                        task.done() and not task.cancelled() and task.exception() is None
+                        and task.result()
+                    )
+                    self._current = self._current_task = None
+                    if not clip.done.done():
+                        clip.done.set_result(played)
+                handoff = self._channel is not None and self._channel.alive
+
+    async def _play_media_locked(self, media_url, lead_in_ms=None) -> bool:
+        """Play one clip; the caller holds the lock. lead_in_ms overrides the configured lead-in.
+
+        Returns whether the whole clip was sent to the camera.
+        """
+        prefetch = None
+        handshake = None
+        if lead_in_ms is None:
+            lead_in_ms = self._lead_in_ms
+        timings = PlaybackTimings(lead_in_ms=lead_in_ms)
+        self.last_timings = timings
+        self.last_pacing = PacingStats()
+        pacer = _RtpPacer(self._send_rtp, self.last_pacing)
+        started = time.monotonic()
+
+        async def _open_channel():
+            previous_channel = self._channel
+            timings.reused_channel = await self._acquire_channel() is previous_channel
+            timings.handshake = time.monotonic() - started
+
+        try:
+            _LOGGER.info("Starting playback session...")
+            # The handshake and fetching the source run concurrently; the
+            # channel is confirmed open before anything is sent, so packets
+            # can be forwarded from the first one.
+            handshake = asyncio.ensure_future(_open_channel())
+
+            source = None
+            alaw = None
+            prefetch = self._start_prefetch(media_url, timings, started)
+            if prefetch is not None and self._cache is not None:
+                # A cached clip is only used while the source's headers still match it.
+                await prefetch.wait_headers()
+                alaw = await _cache_get(self._cache, media_url, prefetch.validator, self.metrics)
+            if alaw is not None:
+                timings.cache_hit = True
+                prefetch.close()
+            elif prefetch is not None:
+                await prefetch.wait_buffered(PREFETCH_START_BYTES)
+                if self._inprocess_audio and can_decode(prefetch.head):
+                    data = await prefetch.read_all()
+                    alaw = await encode_clip(data, self.metrics)
+                    if alaw is not None and prefetch.complete:
+                        await _cache_put(
+                            self._cache, media_url, alaw, prefetch.validator, self.metrics
+                        )
+                    elif alaw is None and _can_pipe(data, prefetch.content_type):
+                        source = _replay(data)
+                elif prefetch.received and _can_pipe(prefetch.head, prefetch.content_type):
+                    source = prefetch.chunks()
+                else:
+                    prefetch.close()
+            if prefetch is not None and prefetch.error is not None:
+                _LOGGER.warning("Fetching %s failed: %s", media_url, prefetch.error)
+            await handshake
+            _LOGGER.debug(
+                "Handshake took %.3fs, source buffered after %ss", timings.handshake,
+                timings.fetch_buffered,
+            )
+
+            if alaw is not None:
+                timings.in_process = True
+                packets = self._packetizer.packetize(alaw_silence(lead_in_ms) + alaw)
+                await self._stream_packets(packets, timings, started, pacer)
+                await self._channel.flush()
+                _LOGGER.info("In-process playback finished.")
+                # As with ffmpeg below, a clip cut short by the fetch is not a success.
+                return timings.cache_hit or prefetch.complete
+
+            payloads = []
+            returncode, sent = await self._run_ffmpeg(
+                media_url, source, lead_in_ms, pacer, timings, started, payloads
+            )
+            if returncode != 0 and source is not None and not sent:
+                # Some sources only decode when ffmpeg can open (and seek) them itself.
+                _LOGGER.info("FFmpeg could not read %s from a pipe; opening the URL.", media_url)
+                prefetch.close()
+                source = None
+                payloads.clear()
+                returncode, sent = await self._run_ffmpeg(
+                    media_url, None, lead_in_ms, pacer, timings, started, payloads
+                )
+
+            await self._channel.flush()
             _LOGGER.info("FFmpeg process finished.")
+            if returncode != 0:
+                return False
+            # A fetch that broke off still decodes cleanly, but only to the
+            # start of the clip; that is neither a success nor worth caching.
+            if source is not None and not prefetch.complete:
+                return False
+            if payloads and prefetch is not None:
+                # The cached clip excludes the lead-in; it is re-added on playback.
+                await _cache_put(
+                    self._cache, media_url, b''.join(payloads), prefetch.validator, self.metrics
+                )
+            return True
 
+        except asyncio.CancelledError:
+            # Interrupted by a more important clip: drop the rest of this one
+            # but keep the channel for whatever plays next.
+            if self._channel is not None:
+                self._channel.discard()
+            raise
         except Exception as e:
-            _LOGGER.error(f"Error during media playback: {e}", exc_info=True)
+            _LOGGER.error("Error during media playback: %s", e, exc_info=True)
+            # Don't hand a channel in an unknown state to the next playback.
+            await self._close_channel()
+            return False
+        finally:
+            if handshake is not None and not handshake.done():
+                handshake.cancel()
+            if prefetch is not None:
+                prefetch.close()
+            self._touch()
+            _LOGGER.debug("Talkback pacing on %s: %s", self._ip, self.last_pacing)
+            _LOGGER.info("Playback session finished; talk channel kept open for reuse.")
+
+    async def _run_ffmpeg(self, media_url, source, lead_in_ms, pacer: _RtpPacer,
+                          timings: PlaybackTimings, started, payloads: List[bytes]):
+        """Transcode with ffmpeg and send its output; returns (exit code, sent anything).
+
+        source is an async iterator of the prefetched clip, fed to ffmpeg on
+        stdin; without one ffmpeg opens media_url itself. ffmpeg writes raw
+        A-law to a pipe that is only read as the pacer sends it on, so a
+        full pipe holds ffmpeg back and nothing can be lost or pile up in
+        memory. payloads collects the clip for the cache, without the lead-in.
+        """
+        process = None
+        stderr_task = None
+        feeder = None
+        sent = False
+        cacheable = self._cache is not None
+        try:
+            command = [
+                'ffmpeg', '-i', 'pipe:0' if source is not None else media_url,
+                '-acodec', 'pcm_alaw', '-ar', '8000', '-ac', '1', '-f', 'alaw', 'pipe:1',
+            ]
+            _LOGGER.info("Starting FFmpeg to play: %s", media_url)
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.PIPE if source is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            )
+            timings.ffmpeg_spawn = time.monotonic() - started
+            if source is not None:
+                feeder = asyncio.ensure_future(_feed_stdin(process, source))
+            stderr_task = asyncio.ensure_future(process.stderr.read())
+
+            # The lead-in goes out with the first audio, so a source ffmpeg
+            # cannot decode sends nothing and can be retried.
+            pending = bytearray(alaw_silence(lead_in_ms))
+            # Bytes of audio read from ffmpeg so far.
+            received = 0
+            while True:
+                chunk = await process.stdout.read(FFMPEG_READ_SIZE)
+                if not chunk and not received:
+                    break
+                received += len(chunk)
+                if cacheable and chunk:
+                    if received > CACHEABLE_CLIP_BYTES:
+                        cacheable = False
+                        payloads.clear()
+                    else:
+                        payloads.append(chunk)
+                pending += chunk
+                # Send whole packets; the tail goes out once ffmpeg is done.
+                size = len(pending) if not chunk else len(pending) - len(pending) % SAMPLES_PER_PACKET
+                for rtp_packet in self._packetizer.packetize(bytes(pending[:size]), marker=not sent):
+                    await pacer.send(rtp_packet)
+                    sent = True
+                    if timings.first_packet is None:
+                        timings.first_packet = time.monotonic() - started
+                        _LOGGER.debug("Talkback start-up on %s: %s", self._ip, timings)
+                del pending[:size]
+                if not chunk:
+                    break
+            await process.wait()
+            if not cacheable:
+                payloads.clear()
+            return process.returncode, sent
         finally:
+            if feeder is not None:
+                feeder.cancel()
             if process:
-                stderr = process.communicate()[1]
-                if stderr and process.returncode != 0:
-                     _LOGGER.error(f"FFmpeg error: {stderr.decode()}")
-                process.terminate()
-            if udp_sock: udp_sock.close()
-            if camera_sock: camera_sock.close()
-            _LOGGER.info("Playback session finished and all resources cleaned up.")
+                # Shielded so a second cancellation cannot leave ffmpeg or its
+                # stderr reader behind; reaping then finishes in the background.
+                await asyncio.shield(self._reap_ffmpeg(process, stderr_task))
+
+    async def _reap_ffmpeg(self, process, stderr_task):
+        """Stop ffmpeg if it is still running and record how it exited."""
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+        self.metrics.record_ffmpeg_exit(process.returncode)
+        stderr = await stderr_task
+        if stderr and process.returncode != 0:
+            _LOGGER.error("FFmpeg error: %s", stderr.decode(errors='replace'))
 
     def _md5_str(self, s):
         return hashlib.md5(s.encode('utf-8')).hexdigest()
@@ -74,46 +1027,87 @@ class TPLinkTalkbackPlayer:
         ha2 = self._md5_str(f"{method}:{uri}")
         return self._md5_str(f"{ha1}:{nonce}:{ha2}")
 
-    def _connect_and_auth(self):
-        """Performs the full 3-step MULTITRANS handshake."""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(10)
+    def _auth_request(self, uri, cseq, challenge):
+        realm = challenge.get("realm", "")
+        nonce = challenge.get("nonce", "")
+        response = self._calculate_digest(realm, nonce, "MULTITRANS", uri)
+        auth_header = f'Digest username="{self._user}", realm="{realm}", nonce="{nonce}", uri="{uri}", response="{response}"'
+        return (f"MULTITRANS {uri} RTSP/1.0\r\nCSeq: {cseq}\r\nAuthorization: {auth_header}\r\n"
+                f"X-Client-UUID: {self._client_uuid}\r\n\r\n")
+
+    async def _connect_and_auth(self):
+        """Performs the MULTITRANS handshake.
+
+        The digest challenge of the previous handshake is reused, so a
+        reconnect normally skips the challenge round-trip. If the camera
+        rejects the stale nonce, its 401 carries a fresh challenge and the
+        handshake continues exactly as a cold one would.
+        """
+        writer = None
+        cached_challenge = self._challenge
         try:
-            sock.connect((self._ip, 554))
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self._ip, self._rtsp_port), CONNECT_TIMEOUT
+            )
             uri = f"rtsp://{self._ip}/multitrans"
+            parser = RtspResponseParser()
+            pending = []
+            cseq = 0
+
+            async def exchange(request):
+                nonlocal cseq
+                cseq += 1
+                writer.write(request.encode())
+                await writer.drain()
+                while not pending:
+                    data = await asyncio.wait_for(reader.read(4096), CONNECT_TIMEOUT)
+                    if not data:
+                        raise ConnectionError("Camera closed the connection during the handshake.")
+                    pending.extend(parser.feed(data))
+                return pending.pop(0)
+
+            # Step 1: Get challenge, unless the previous one can be reused
+            challenge = cached_challenge
+            if challenge is None:
+                req1 = (f"MULTITRANS {uri} RTSP/1.0\r\nCSeq: {cseq}\r\n"
+                        f"X-Client-UUID: {self._client_uuid}\r\n\r\n")
+                resp1 = await exchange(req1)
+                challenge = resp1.digest_challenge if resp1.status == 401 else None
+                if challenge is None:
+                    raise ConnectionError("Failed to get auth challenge.")
 
-            # Step 1: Get challenge
-            req1 = (f"MULTITRANS {uri} RTSP/1.0\r\nCSeq: 0\r\n"
-                    f"X-Client-UUID: {self._client_uuid}\r\n\r\n")
-            sock.sendall(req1.encode())
-            resp1 = sock.recv(2048).decode()
-            if "401" not in resp1: raise ConnectionError("Failed to get auth challenge.")
-            
-            digest_line = [l for l in resp1.split('\r\n') if 'WWW-Authenticate: Digest' in l][0]
-            realm = digest_line.split('realm="')[1].split('"')[0]
-            nonce = digest_line.split('nonce="')[1].split('"')[0]
-            
             # Step 2: Send auth
-            response = self._calculate_digest(realm, nonce, "MULTITRANS", uri)
-            auth_header = f'Digest username="{self._user}", realm="{realm}", nonce="{nonce}", uri="{uri}", response="{response}"'
-            req2 = (f"MULTITRANS {uri} RTSP/1.0\r\nCSeq: 1\r\nAuthorization: {auth_header}\r\n"
-                    f"X-Client-UUID: {self._client_uuid}\r\n\r\n")
-            sock.sendall(req2.encode())
-            resp2 = sock.recv(2048).decode()
-            if "200 OK" not in resp2: raise ConnectionRefusedError("Authentication failed.")
-            session_id = [l for l in resp2.split('\r\n') if 'Session:' in l][0].split(': ')[1].strip()
+            resp2 = await exchange(self._auth_request(uri, cseq, challenge))
+            fresh_challenge = resp2.digest_challenge if resp2.status == 401 else None
+            if fresh_challenge is not None and challenge is cached_challenge:
+                # The cached nonce went stale; the rejection carries a fresh one.
+                challenge = fresh_challenge
+                resp2 = await exchange(self._auth_request(uri, cseq, challenge))
+            if resp2.status != 200:
+                self._challenge = None
+                raise ConnectionRefusedError(f"Authentication failed: {resp2.status} {resp2.reason}")
+            self._challenge = challenge
+            session_id = resp2.session
+            if not session_id:
+                raise ConnectionError("Camera did not return a session id.")
 
             # Step 3: Open talk channel
             payload = json.dumps({"type":"request","seq":0,"params":{"method":"get","talk":{"mode":"half_duplex"}}})
-            req3 = (f"MULTITRANS {uri} RTSP/1.0\r\nCSeq: 2\r\nSession: {session_id}\r\n"
+            req3 = (f"MULTITRANS {uri} RTSP/1.0\r\nCSeq: {cseq}\r\nSession: {session_id}\r\n"
                     f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n{payload}")
-            sock.sendall(req3.encode())
-            resp3 = sock.recv(2048).decode()
-            if '"error_code":0' not in resp3: raise ConnectionError("Failed to open talkback channel.")
-            
+            resp3 = await exchange(req3)
+            error_code = _find_error_code(resp3.json()) if resp3.body else None
+            if resp3.status != 200 or error_code != 0:
+                raise ConnectionError(f"Failed to open talkback channel: {resp3.status} {resp3.body!r}")
+
             _LOGGER.info("Successfully authenticated and talkback channel is open.")
-            return sock
+            return reader, writer
         except Exception as e:
-            sock.close()
-            _LOGGER.error(f"Handshake failed: {e}")
-            return None
\ No newline at end of file
+            if writer is not None:
+                writer.close()
+            if cached_challenge is not None and self._challenge is cached_challenge:
+                # The camera may answer a stale nonce by hanging up or timing out
+                # rather than with a new 401; start from a fresh challenge next time.
+                self._challenge = None
+            _LOGGER.error("Handshake failed: %s", e)
+            return None